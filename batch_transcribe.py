@@ -0,0 +1,318 @@
+# batch_transcribe.py
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from config import AUDIO_DIR, BATCH_STT_CONFIG, LOGGING_CONFIG, STT_CONFIG
+from metrics import metrics
+from stt_backends import Transcriber, load_audio, probe_duration
+import logging
+
+# ===========================
+# Logger Setup
+# ===========================
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Worker Process Functions
+# ===========================
+
+_worker_transcriber = None
+
+def _init_worker(backend: str, model_size: str, threads: int):
+    """Load one model per worker process so it is reused for every bucket the worker handles."""
+    global _worker_transcriber
+    STT_CONFIG['CPU_THREADS'] = threads  # Split the cores between workers instead of oversubscribing
+    _worker_transcriber = Transcriber(backend, model_size)
+
+def transcribe_bucket(paths: List[str]) -> List[Dict]:
+    """
+    Transcribe a bucket of files inside a worker process.
+
+    :param paths: Audio file paths of similar duration.
+    :return: One record per file with its text, duration, processing time and error (if any).
+    """
+    records = []
+    for path in paths:
+        start = time.perf_counter()
+        try:
+            audio = load_audio(path)
+            text = _worker_transcriber.transcribe(audio)
+            records.append({
+                'path': path,
+                'text': text,
+                'duration': len(audio) / STT_CONFIG['SAMPLE_RATE'],
+                'seconds': time.perf_counter() - start,
+                'error': None,
+            })
+        except Exception as e:
+            records.append({'path': path, 'text': None, 'duration': None,
+                            'seconds': time.perf_counter() - start, 'error': str(e)})
+    return records
+
+# ===========================
+# BatchTranscriber Class
+# ===========================
+
+class BatchTranscriber:
+    def __init__(self, ingestor=None, output_path: Optional[Path] = None, backend: str = None,
+                 model_size: str = None, workers: int = None):
+        """
+        Initialize offline transcription of recorded audio.
+
+        :param ingestor: Optional DocumentIngestor; transcripts are stored and indexed through it.
+        :param output_path: JSONL file receiving one record per file; defaults to 'OUTPUT_FILE'.
+        :param backend: STT backend name; defaults to STT_CONFIG['BACKEND'].
+        :param model_size: Whisper model size; defaults to STT_CONFIG['MODEL_NAME'].
+        :param workers: Worker processes; defaults to BATCH_STT_CONFIG['WORKERS'].
+        """
+        self.ingestor = ingestor
+        self.output_path = Path(output_path or BATCH_STT_CONFIG['OUTPUT_FILE'])
+        self.backend = backend or STT_CONFIG['BACKEND']
+        self.model_size = model_size or STT_CONFIG['MODEL_NAME']
+        self.workers = workers or BATCH_STT_CONFIG['WORKERS']
+
+    # ===========================
+    # Input Discovery
+    # ===========================
+
+    def find_audio(self, directory: Path) -> List[Path]:
+        """
+        Recursively list audio files under a directory.
+
+        :param directory: Root directory to walk.
+        :return: Sorted list of audio file paths.
+        """
+        extensions = {ext.lower() for ext in BATCH_STT_CONFIG['EXTENSIONS']}
+        return sorted(
+            path for path in Path(directory).rglob('*')
+            if path.is_file() and path.suffix.lower() in extensions
+        )
+
+    def read_manifest(self, manifest: Path) -> List[Path]:
+        """
+        Read audio paths from a manifest.
+
+        Accepts one path per line, or JSON lines with a "path" key. Relative paths are
+        resolved against the manifest's directory; blank lines and '#' comments are ignored.
+
+        :param manifest: Manifest file path.
+        :return: List of audio file paths.
+        """
+        manifest = Path(manifest)
+        paths = []
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                entry = json.loads(line)['path'] if line.startswith('{') else line
+                path = Path(entry)
+                paths.append(path if path.is_absolute() else manifest.parent / path)
+        return paths
+
+    # ===========================
+    # Resume State
+    # ===========================
+
+    def _load_done(self) -> Dict[str, Dict]:
+        """Return the successful records already in the output file, keyed by resolved path."""
+        done = {}
+        if not self.output_path.exists():
+            return done
+        with open(self.output_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A run interrupted mid-write can leave a partial last line
+                if record.get('error') is None:
+                    done[record['key']] = record
+        return done
+
+    @staticmethod
+    def _file_key(path: Path) -> Dict:
+        """Identify a file version by resolved path, size and modification time."""
+        stat = path.stat()
+        return {'key': str(path.resolve()), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    # ===========================
+    # Transcription
+    # ===========================
+
+    def transcribe_directory(self, directory=None, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+        """
+        Transcribe every audio file under a directory (AUDIO_DIR by default).
+
+        :param directory: Root directory to walk.
+        :param progress: Optional callback receiving (processed, total) after each bucket.
+        :return: Counts of transcribed, skipped and failed files.
+        """
+        directory = Path(directory or AUDIO_DIR)
+        return self.transcribe_files(self.find_audio(directory), root=directory, progress=progress)
+
+    def transcribe_files(self, paths: List[Path], root: Optional[Path] = None,
+                         progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+        """
+        Transcribe a list of audio files across the worker pool.
+
+        Files are sorted by duration and grouped into buckets, so each task holds clips
+        of similar length and the longest work starts first. Results are appended to the
+        output file (and stored as documents) as each bucket finishes, so an interrupted
+        run resumes where it stopped.
+
+        :param paths: Audio files to transcribe.
+        :param root: Directory that document names are made relative to; base names are used if omitted.
+        :param progress: Optional callback receiving (processed, total) after each bucket.
+        :return: Counts of transcribed, skipped and failed files.
+        """
+        done = self._load_done()
+        pending, keys, unreadable = [], {}, 0
+        for path in map(Path, paths):
+            try:
+                key = self._file_key(path)
+            except OSError as e:
+                logger.error(f"Failed to read {path}: {e}")
+                unreadable += 1
+                continue
+            previous = done.get(key['key'])
+            if previous and previous['size'] == key['size'] and previous['mtime'] == key['mtime']:
+                continue
+            keys[str(path)] = key
+            pending.append(path)
+
+        counts = {'transcribed': 0, 'skipped': len(paths) - len(pending) - unreadable, 'failed': unreadable}
+        total = len(pending)
+        logger.info(f"Transcribing {total} audio files ({counts['skipped']} already done).")
+        if not pending:
+            return counts
+
+        # A file that cannot be probed (truncated, or not really WAV) fails alone instead of the batch
+        durations = {}
+        for path in pending:
+            try:
+                durations[path] = probe_duration(path)
+            except Exception as e:
+                logger.error(f"Failed to read {path}: {e}")
+                counts['failed'] += 1
+        pending = sorted(durations, key=durations.get, reverse=True)
+        total = len(pending)
+        if not pending:
+            return counts
+
+        bucket_size = BATCH_STT_CONFIG['BUCKET_SIZE']
+        buckets = [[str(path) for path in pending[i:i + bucket_size]] for i in range(0, total, bucket_size)]
+        workers = min(self.workers, len(buckets))
+        threads = max(1, (STT_CONFIG['CPU_THREADS'] or os.cpu_count() or 1) // workers)
+
+        processed = 0
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.backend, self.model_size, threads)) as executor, \
+                open(self.output_path, 'a', encoding='utf-8') as output:
+            futures = {executor.submit(transcribe_bucket, bucket): bucket for bucket in buckets}
+            for future in as_completed(futures):
+                try:
+                    records = future.result()
+                except Exception as e:
+                    # e.g. a worker killed mid-bucket; transcripts from other buckets are still kept
+                    logger.error(f"Transcription worker failed on {len(futures[future])} files: {e}")
+                    records = [{'path': path, 'text': None, 'duration': None, 'seconds': 0.0, 'error': str(e)}
+                               for path in futures[future]]
+                processed += len(records)
+                ok = [record for record in records if record['error'] is None]
+                for record in records:
+                    if record['error'] is not None:
+                        logger.error(f"Failed to transcribe {record['path']}: {record['error']}")
+                    else:
+                        metrics.observe('stt.batch_transcribe', record['seconds'])
+
+                if ok and not self._store(ok, root):
+                    ok = []  # Not recorded as done, so the next run retries them
+                for record in ok:
+                    record.update(keys[record['path']])
+                    output.write(json.dumps(record) + "\n")
+                output.flush()
+
+                counts['transcribed'] += len(ok)
+                counts['failed'] += len(records) - len(ok)
+                if progress:
+                    progress(processed, total)
+
+        logger.info(f"Batch transcription finished: {counts}")
+        return counts
+
+    def _store(self, records: List[Dict], root: Optional[Path]) -> bool:
+        """Add non-empty transcripts to the document store and index as searchable documents."""
+        if self.ingestor is None:
+            return True
+        documents = {}
+        for record in records:
+            if not record['text']:
+                continue
+            path = Path(record['path'])
+            name = path.relative_to(root).as_posix() if root and path.is_relative_to(root) else path.name
+            record['doc_name'] = BATCH_STT_CONFIG['DOC_PREFIX'] + name
+            documents[record['doc_name']] = record['text']
+        return not documents or self.ingestor.commit_documents(documents)
+
+# ===========================
+# Main Function for Batch Transcription
+# ===========================
+
+def main():
+    """Command-line entry point for transcribing recorded audio into the document store."""
+    parser = argparse.ArgumentParser(description="Transcribe a directory or manifest of audio files.")
+    parser.add_argument('directory', nargs='?', type=Path, help=f"Audio directory (default: {AUDIO_DIR})")
+    parser.add_argument('--manifest', type=Path, help="File listing audio paths (plain lines or JSON lines with 'path')")
+    parser.add_argument('--user', default="global", help="User ID that owns the transcripts")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: BATCH_STT_CONFIG['WORKERS'])")
+    parser.add_argument('--output', type=Path, help="JSONL output (default: BATCH_STT_CONFIG['OUTPUT_FILE'])")
+    parser.add_argument('--no-index', action='store_true', help="Only write transcripts; do not store or index them")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        filename=LOGGING_CONFIG['LOG_FILE'],
+        level=logging.getLevelName(LOGGING_CONFIG['LOG_LEVEL']),
+        format='%(asctime)s:%(levelname)s:%(message)s'
+    )
+
+    ingestor = None
+    if not args.no_index:
+        # Deferred so worker processes never import the embedding model
+        from database_manager import DatabaseManager
+        from document_ingest import DocumentIngestor
+        from rag_optimizer import RAGOptimizer
+        ingestor = DocumentIngestor(DatabaseManager(), RAGOptimizer(), user_id=args.user)
+
+    batch = BatchTranscriber(ingestor=ingestor, output_path=args.output, workers=args.workers)
+    report = lambda done, total: print(f"Transcribed {done}/{total} files", flush=True)
+    if args.manifest:
+        counts = batch.transcribe_files(batch.read_manifest(args.manifest), root=args.manifest.parent, progress=report)
+    else:
+        counts = batch.transcribe_directory(args.directory, progress=report)
+    print(f"Transcribed {counts['transcribed']}, skipped {counts['skipped']}, failed {counts['failed']}.")
+
+# ===========================
+# Entry Point
+# ===========================
+
+if __name__ == "__main__":
+    main()
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# This script transcribes recorded audio offline and feeds the transcripts into the document store.
+# To modify:
+# - Tune 'WORKERS' and 'BUCKET_SIZE' in BATCH_STT_CONFIG; each worker loads its own model, so memory
+#   grows with 'WORKERS'.
+# - Choose the engine and model with 'BACKEND' and 'MODEL_NAME' in STT_CONFIG (int8 faster-whisper is
+#   the fastest on CPU).
+# - Remove entries from 'OUTPUT_FILE' (or the file itself) to force files to be transcribed again.
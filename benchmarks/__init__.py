@@ -0,0 +1,4 @@
+# benchmarks/__init__.py
+
+# Reproducible, offline benchmarks for Theraxus. Run from the repository root:
+#     python -m benchmarks.run --scales 1000 10000
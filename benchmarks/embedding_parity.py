@@ -0,0 +1,91 @@
+# benchmarks/embedding_parity.py
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from config import RAG_CONFIG
+from embedding_backends import BACKENDS, PARITY_SAMPLES, check_parity, create_embedding_model
+
+# ===========================
+# Measurement
+# ===========================
+
+def throughput(model, texts: List[str], batch_size: int, repeats: int = 3) -> float:
+    """Best-of-`repeats` texts embedded per second."""
+    model.encode(texts[:batch_size], batch_size=batch_size)  # Warm-up
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.encode(texts, batch_size=batch_size)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+def compare(reference_name: str, candidate_name: str, model_name: str, texts: List[str]) -> Dict:
+    """Measure cosine drift and speed of a candidate backend against a reference backend."""
+    reference = create_embedding_model(reference_name, model_name)
+    candidate = create_embedding_model(candidate_name, model_name)
+    batch_size = RAG_CONFIG['EMBED_BATCH_SIZE']
+    result = {
+        'model_name': model_name,
+        'reference': reference.backend_name,
+        'candidate': candidate.backend_name,
+        'texts': len(texts),
+        'reference_texts_per_s': throughput(reference, texts, batch_size),
+        'candidate_texts_per_s': throughput(candidate, texts, batch_size),
+    }
+    result.update(check_parity(reference, candidate, texts))
+    return result
+
+# ===========================
+# Main Function for Embedding Parity
+# ===========================
+
+def main():
+    """Command-line entry point checking a quantized embedding backend against PyTorch."""
+    parser = argparse.ArgumentParser(description="Check cosine drift and speed of an embedding backend.")
+    parser.add_argument('--texts', type=Path, help="Text file with one sample per line (default: built-in samples)")
+    parser.add_argument('--model', default=RAG_CONFIG['EMBEDDING_MODEL'])
+    parser.add_argument('--reference', default='torch', choices=list(BACKENDS))
+    parser.add_argument('--candidate', default='onnx-int8', choices=list(BACKENDS))
+    parser.add_argument('--min-cosine', type=float, default=RAG_CONFIG['PARITY_MIN_COSINE'])
+    parser.add_argument('--output', type=Path, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    texts = PARITY_SAMPLES
+    if args.texts:
+        texts = [line.strip() for line in args.texts.read_text(encoding='utf-8').splitlines() if line.strip()]
+
+    result = compare(args.reference, args.candidate, args.model, texts)
+    # create_embedding_model falls back to PyTorch, which would otherwise pass trivially
+    result['passed'] = result['candidate'] == args.candidate and result['min_cosine'] >= args.min_cosine
+    if result['candidate'] != args.candidate:
+        print(f"Backend '{args.candidate}' could not be loaded (see the log); measured '{result['candidate']}' instead.")
+    print(f"{result['candidate']} vs {result['reference']} on {result['texts']} texts: "
+          f"min cosine {result['min_cosine']:.4f}, mean {result['mean_cosine']:.4f} "
+          f"(bound {args.min_cosine}); {result['candidate_texts_per_s']:.1f} vs "
+          f"{result['reference_texts_per_s']:.1f} texts/s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=4)
+    if not result['passed']:
+        sys.exit(1)
+
+# ===========================
+# Entry Point
+# ===========================
+
+if __name__ == "__main__":
+    main()
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# Run from the repository root:
+#     python -m benchmarks.embedding_parity --texts my_samples.txt
+# Exits with status 1 when any text's embedding falls below the cosine bound, so it can gate a
+# switch of 'EMBEDDING_BACKEND' in CI. Use texts resembling your documents and questions.
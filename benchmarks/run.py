@@ -0,0 +1,237 @@
+# benchmarks/run.py
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+
+from benchmarks.stubs import StubEmbeddingModel, StubSTT, StubTTS
+from benchmarks.synthetic import generate_chat_history, generate_corpus, generate_queries
+from config import BASE_DIR, RAG_CONFIG
+from database_manager import DatabaseManager
+from metrics import metrics
+from rag_optimizer import RAGOptimizer
+from runllm import TheraxusAI
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+# ===========================
+# Helper Functions
+# ===========================
+
+def latency_summary(samples: List[float]) -> Dict:
+    """Summarize latency samples (seconds) as count, mean, p50, p99 and max."""
+    values = np.asarray(samples, dtype=np.float64)
+    return {
+        'count': int(values.size),
+        'mean_s': float(values.mean()),
+        'p50_s': float(np.percentile(values, 50)),
+        'p99_s': float(np.percentile(values, 99)),
+        'max_s': float(values.max()),
+    }
+
+def git_revision() -> Dict:
+    """Return the current commit and whether the tree has uncommitted changes."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain'], cwd=BASE_DIR, capture_output=True, text=True).stdout.strip())
+        return {'commit': commit or None, 'dirty': dirty}
+    except Exception:
+        return {'commit': None, 'dirty': None}
+
+# ===========================
+# Benchmarks
+# ===========================
+
+def bench_chat(workdir: Path, scale: int, ops: int) -> Dict:
+    """
+    Measure add_chat/get_chat_history throughput against a history of `scale` messages.
+    """
+    db = DatabaseManager(data_dir=workdir)
+    history = generate_chat_history(users=100, messages=scale)
+    with open(db.conversations_path, 'w') as f:
+        json.dump(history, f)
+
+    user_id = next(iter(history))
+    start = time.perf_counter()
+    for i in range(ops):
+        db.add_chat(user_id, 'user', f"benchmark message {i}")
+    add_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(ops):
+        db.get_chat_history(user_id)
+    get_seconds = time.perf_counter() - start
+
+    return {
+        'history_messages': scale,
+        'ops': ops,
+        'add_chat_ops_per_s': ops / add_seconds,
+        'get_chat_history_ops_per_s': ops / get_seconds,
+    }
+
+def bench_retrieval(workdir: Path, scale: int, num_queries: int, model: StubEmbeddingModel) -> Tuple[Dict, Tuple]:
+    """
+    Measure document storage, index build time, search latency and recall@k against exact search.
+
+    :return: The results, and the (db, rag, queries) built along the way for reuse by `bench_turns`.
+    """
+    corpus = generate_corpus(scale)
+    queries = generate_queries(corpus, num_queries)
+    db = DatabaseManager(data_dir=workdir)
+    # Created before the documents exist so its constructor does not build the index itself
+    rag = RAGOptimizer(db_manager=db, embedding_model=model, cache_dir=workdir / 'cache')
+
+    start = time.perf_counter()
+    db.add_documents(corpus)
+    add_documents_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rag.build_index()
+    build_seconds = time.perf_counter() - start
+
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(rag.search_documents(query))
+        latencies.append(time.perf_counter() - start)
+
+    # Exact top-k by brute force over the same embeddings is the recall reference
+    names = list(corpus.keys())
+    doc_embeddings = model.encode(list(corpus.values()))
+    query_embeddings = model.encode(queries)
+    k = min(RAG_CONFIG['TOP_K'], len(names))
+    scores = query_embeddings @ doc_embeddings.T
+    hits = 0
+    for row, found in enumerate(results):
+        exact = np.argpartition(-scores[row], k - 1)[:k]
+        hits += len(set(found) & {names[i] for i in exact})
+
+    result = {
+        'documents': scale,
+        'add_documents_s': add_documents_seconds,
+        'build_index_s': build_seconds,
+        'search': latency_summary(latencies),
+        f'recall_at_{k}': hits / (k * len(queries)),
+    }
+    return result, (db, rag, queries)
+
+def bench_turns(components, num_turns: int) -> Dict:
+    """
+    Measure end-to-end turn latency: stub STT, generate_response, stub TTS.
+    """
+    db, rag, queries = components
+    tts = StubTTS()
+    stt = StubSTT(queries)
+    ai = TheraxusAI(user_id='bench_user', db_manager=db, rag=rag, tts=tts)
+
+    latencies = []
+    for _ in range(num_turns):
+        start = time.perf_counter()
+        user_input, _ = stt.process_audio()
+        response = ai.generate_response(user_input)
+        tts.speak(response)
+        latencies.append(time.perf_counter() - start)
+    return latency_summary(latencies)
+
+# ===========================
+# Report
+# ===========================
+
+def run(scales: List[int], queries: int, chat_ops: int, turns: int) -> Dict:
+    """Run every benchmark at each scale and return the report dictionary."""
+    metrics.enabled = False  # Keep instrumentation overhead out of the measurements
+    model = StubEmbeddingModel()
+    report = {
+        'meta': {
+            **git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'top_k': RAG_CONFIG['TOP_K'],
+        },
+        'results': {},
+    }
+    for scale in scales:
+        print(f"Scale {scale}...", flush=True)
+        with tempfile.TemporaryDirectory(prefix='theraxus_bench_') as tmp:
+            workdir = Path(tmp)
+            chat = bench_chat(workdir / 'chat', scale, chat_ops)
+            retrieval, components = bench_retrieval(workdir / 'retrieval', scale, queries, model)
+            turn = bench_turns(components, turns)
+        report['results'][str(scale)] = {'chat': chat, 'retrieval': retrieval, 'turn': turn}
+    return report
+
+def flatten(data: Dict, prefix: str = '') -> Dict[str, float]:
+    """Flatten nested numeric results into dotted keys."""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(current: Dict, baseline: Dict):
+    """Print every metric of `current` next to `baseline` with the relative change."""
+    now, before = flatten(current['results']), flatten(baseline['results'])
+    print(f"Baseline {baseline['meta'].get('commit')} -> current {current['meta'].get('commit')}")
+    for key in sorted(now):
+        if key in before and before[key]:
+            change = (now[key] - before[key]) / before[key] * 100
+            print(f"{key:60s} {before[key]:14.6g} {now[key]:14.6g} {change:+8.1f}%")
+
+# ===========================
+# Main Function for Benchmarks
+# ===========================
+
+def main():
+    """Command-line entry point for the benchmark suite."""
+    parser = argparse.ArgumentParser(description="Run the Theraxus storage, retrieval and turn benchmarks.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000],
+                        help="Corpus and chat history sizes to benchmark (e.g. 1000 10000 100000 1000000)")
+    parser.add_argument('--queries', type=int, default=200, help="Search queries per scale")
+    parser.add_argument('--chat-ops', type=int, default=200, help="add_chat/get_chat_history calls per scale")
+    parser.add_argument('--turns', type=int, default=50, help="End-to-end turns per scale")
+    parser.add_argument('--output', type=Path, help="Report path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', type=Path, help="Earlier report to diff against")
+    args = parser.parse_args()
+
+    report = run(args.scales, args.queries, args.chat_ops, args.turns)
+
+    output = args.output or RESULTS_DIR / f"{(report['meta']['commit'] or 'unknown')[:12]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=4, sort_keys=True)
+    print(f"Report written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(report, json.load(f))
+
+# ===========================
+# Entry Point
+# ===========================
+
+if __name__ == "__main__":
+    main()
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# Run from the repository root so the Theraxus modules are importable:
+#     python -m benchmarks.run --scales 1000 10000 100000 1000000
+#     python -m benchmarks.run --compare benchmarks/results/<older-commit>.json
+# Everything runs offline on CPU: embeddings, STT and TTS are replaced by the deterministic stubs in
+# benchmarks/stubs.py, and all data is written to a temporary directory.
+# - Add a benchmark by writing a bench_* function and adding its result to `run`.
+# - Reports are plain JSON with sorted keys, so two reports can also be compared with any diff tool.
@@ -0,0 +1,125 @@
+# benchmarks/stt_compare.py
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+
+from config import STT_CONFIG
+from stt_backends import BACKENDS, create_backend, load_audio
+
+# ===========================
+# Scoring Helpers
+# ===========================
+
+def normalize(text: str) -> List[str]:
+    """Lower-case, strip punctuation and split into words."""
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+def word_errors(reference: str, hypothesis: str) -> Tuple[int, int]:
+    """
+    Count word-level edit operations between reference and hypothesis.
+
+    :return: (substitutions + deletions + insertions, number of reference words).
+    """
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1], len(ref)
+
+def load_dataset(directory: Path) -> List[Tuple[Path, str]]:
+    """Pair each `<name>.wav` with the reference transcript in `<name>.txt`."""
+    pairs = []
+    for wav_path in sorted(directory.glob('*.wav')):
+        txt_path = wav_path.with_suffix('.txt')
+        if txt_path.exists():
+            pairs.append((wav_path, txt_path.read_text(encoding='utf-8').strip()))
+    return pairs
+
+# ===========================
+# Comparison
+# ===========================
+
+def evaluate(backend_name: str, model_size: str, dataset: List[Tuple[Path, np.ndarray, str]]) -> Dict:
+    """Transcribe the dataset with one backend/model and return WER and latency figures."""
+    start = time.perf_counter()
+    backend = create_backend(backend_name, model_size)
+    load_seconds = time.perf_counter() - start
+
+    backend.transcribe(dataset[0][1])  # Warm-up so one-time setup is not counted as latency
+
+    errors = words = 0
+    latencies, audio_seconds = [], 0.0
+    for _, audio, reference in dataset:
+        start = time.perf_counter()
+        hypothesis = backend.transcribe(audio)
+        latencies.append(time.perf_counter() - start)
+        audio_seconds += len(audio) / STT_CONFIG['SAMPLE_RATE']
+        clip_errors, clip_words = word_errors(reference, hypothesis)
+        errors += clip_errors
+        words += clip_words
+
+    return {
+        'backend': backend.name,
+        'model_size': model_size,
+        'load_s': load_seconds,
+        'wer': errors / max(words, 1),
+        'latency_p50_s': float(np.percentile(latencies, 50)),
+        'latency_p99_s': float(np.percentile(latencies, 99)),
+        'real_time_factor': sum(latencies) / audio_seconds,
+    }
+
+# ===========================
+# Main Function for STT Comparison
+# ===========================
+
+def main():
+    """Command-line entry point comparing STT backends on a local WAV set."""
+    parser = argparse.ArgumentParser(description="Compare STT backends by WER and latency on local WAV files.")
+    parser.add_argument('wav_dir', type=Path, help="Directory of <name>.wav files with <name>.txt references")
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('--sizes', nargs='+', default=[STT_CONFIG['MODEL_NAME']], help="Whisper model sizes")
+    parser.add_argument('--output', type=Path, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    pairs = load_dataset(args.wav_dir)
+    if not pairs:
+        parser.error(f"No .wav files with matching .txt references found in {args.wav_dir}")
+    dataset = [(path, load_audio(path), text) for path, text in pairs]
+
+    results = []
+    print(f"{'backend':16s} {'size':8s} {'WER':>7s} {'p50 s':>8s} {'p99 s':>8s} {'RTF':>6s}")
+    for backend_name in args.backends:
+        for size in args.sizes:
+            result = evaluate(backend_name, size, dataset)
+            results.append(result)
+            print(f"{result['backend']:16s} {size:8s} {result['wer']:7.3f} {result['latency_p50_s']:8.3f} "
+                  f"{result['latency_p99_s']:8.3f} {result['real_time_factor']:6.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'clips': len(dataset), 'config': {k: STT_CONFIG[k] for k in ('BEAM_SIZE', 'CPU_THREADS', 'COMPUTE_TYPE')},
+                       'results': results}, f, indent=4)
+
+# ===========================
+# Entry Point
+# ===========================
+
+if __name__ == "__main__":
+    main()
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# Run from the repository root:
+#     python -m benchmarks.stt_compare path/to/wavs --backends whisper whisper-int8 faster-whisper --sizes tiny base
+# Each <name>.wav needs a <name>.txt with its reference transcript. Real-time factor (RTF) is
+# processing time divided by audio duration; below 1.0 is faster than real time.
@@ -0,0 +1,79 @@
+# benchmarks/stubs.py
+
+import zlib
+from typing import List, Tuple
+import numpy as np
+
+# ===========================
+# StubEmbeddingModel Class
+# ===========================
+
+class StubEmbeddingModel:
+    def __init__(self, dim: int = 384):
+        """
+        Deterministic, CPU-cheap stand-in for SentenceTransformer.
+
+        Uses signed feature hashing of lower-cased tokens, so texts sharing words get
+        similar vectors and the same text always gets the same vector across runs.
+
+        :param dim: Embedding dimension (384 matches all-MiniLM-L6-v2).
+        """
+        self.dim = dim
+        self.model_name = f"feature-hash-{dim}"
+        self.backend_name = "stub"
+
+    def get_sentence_embedding_dimension(self) -> int:
+        """Return the embedding dimension."""
+        return self.dim
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        """Embed a list of texts into L2-normalized float32 vectors."""
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        embeddings = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for row, text in enumerate(sentences):
+            for token in text.lower().split():
+                h = zlib.crc32(token.encode('utf-8'))
+                embeddings[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+# ===========================
+# StubSTT Class
+# ===========================
+
+class StubSTT:
+    def __init__(self, utterances: List[str]):
+        """
+        Stand-in for WhisperSTT that replays fixed utterances without a microphone.
+
+        :param utterances: Transcriptions returned in order, cycling when exhausted.
+        """
+        self.utterances = utterances
+        self.position = 0
+
+    def process_audio(self) -> Tuple[str, bool]:
+        """Return the next scripted transcription."""
+        text = self.utterances[self.position % len(self.utterances)]
+        self.position += 1
+        return text, True
+
+    def cleanup(self):
+        """Nothing to release."""
+
+# ===========================
+# StubTTS Class
+# ===========================
+
+class StubTTS:
+    def __init__(self):
+        """Stand-in for TTS that records what would have been spoken."""
+        self.spoken = 0
+
+    def speak(self, text: str):
+        """Count the utterance instead of playing it."""
+        self.spoken += 1
+
+    def cleanup(self):
+        """Nothing to release."""
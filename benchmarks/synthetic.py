@@ -0,0 +1,79 @@
+# benchmarks/synthetic.py
+
+import random
+from typing import Dict, List
+
+# ===========================
+# Synthetic Data Generation
+# ===========================
+
+def _vocabulary(size: int, rng: random.Random) -> List[str]:
+    """Build a vocabulary of pronounceable pseudo-words."""
+    consonants, vowels = "bcdfghklmnprstvz", "aeiou"
+    words = set()
+    while len(words) < size:
+        length = rng.randint(2, 4)
+        words.add("".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(length)))
+    return sorted(words)
+
+def generate_corpus(num_docs: int, seed: int = 0, num_topics: int = 50, vocab_size: int = 5000) -> Dict[str, str]:
+    """
+    Generate a deterministic topical corpus.
+
+    Each document mixes words from one topic's vocabulary with common words, so
+    documents on the same topic are near each other in embedding space.
+
+    :param num_docs: Number of documents to generate.
+    :param seed: Random seed; the same seed always yields the same corpus.
+    :param num_topics: Number of topic clusters.
+    :param vocab_size: Total vocabulary size.
+    :return: Mapping of document name to content.
+    """
+    rng = random.Random(seed)
+    vocab = _vocabulary(vocab_size, rng)
+    common = vocab[:200]
+    topic_words = [rng.sample(vocab[200:], 80) for _ in range(num_topics)]
+
+    corpus = {}
+    for i in range(num_docs):
+        topic = topic_words[i % num_topics]
+        length = rng.randint(40, 120)
+        words = [rng.choice(topic) if rng.random() < 0.6 else rng.choice(common) for _ in range(length)]
+        corpus[f"doc_{i:07d}.txt"] = " ".join(words)
+    return corpus
+
+def generate_queries(corpus: Dict[str, str], num_queries: int, seed: int = 1) -> List[str]:
+    """
+    Derive queries from random corpus documents by sampling a few of their words.
+
+    :param corpus: Corpus produced by `generate_corpus`.
+    :param num_queries: Number of queries to generate.
+    :param seed: Random seed.
+    :return: List of query strings.
+    """
+    rng = random.Random(seed)
+    names = list(corpus.keys())
+    queries = []
+    for _ in range(num_queries):
+        words = corpus[rng.choice(names)].split()
+        queries.append(" ".join(rng.sample(words, min(8, len(words)))))
+    return queries
+
+def generate_chat_history(users: int, messages: int, seed: int = 2) -> Dict[str, List[Dict]]:
+    """
+    Generate chat histories in the conversations.json layout.
+
+    :param users: Number of distinct users.
+    :param messages: Total number of messages, spread round-robin across users.
+    :param seed: Random seed.
+    :return: Mapping of user ID to a list of {'role', 'content'} messages.
+    """
+    rng = random.Random(seed)
+    vocab = _vocabulary(1000, rng)
+    history = {f"user_{u:04d}": [] for u in range(users)}
+    user_ids = list(history.keys())
+    for i in range(messages):
+        role = "user" if i % 2 == 0 else "assistant"
+        content = " ".join(rng.choice(vocab) for _ in range(rng.randint(5, 40)))
+        history[user_ids[i % users]].append({'role': role, 'content': content})
+    return history
@@ -70,6 +70,30 @@ STT_CONFIG = {
     'SAMPLE_RATE': 16000,      # Audio sample rate in Hz
     'CHANNELS': 1,              # Number of audio channels (1 for mono, 2 for stereo)
     'CHUNK_SIZE': 1024,         # Size of audio chunks for processing
+    'BACKEND': 'faster-whisper',  # 'faster-whisper' (CTranslate2), 'whisper-int8' (quantized torch) or 'whisper'
+    'DEVICE': 'auto',           # 'auto' (CUDA when available), 'cuda' or 'cpu'; 'whisper-int8' always runs on CPU
+    'COMPUTE_TYPE': 'int8',     # faster-whisper precision: 'int8', 'int8_float32', 'float32'; 'int8_float16' on GPU
+    'BEAM_SIZE': 1,             # 1 = greedy decoding (fastest); larger values trade speed for accuracy
+    'CPU_THREADS': 0,           # Inference threads; 0 uses every core
+    'LANGUAGE': None,           # e.g. 'en' to skip language detection; None auto-detects
+    'AUTO_MODEL_SIZE': False,   # Choose the model size per utterance from MODEL_SIZE_BY_DURATION
+    'MODEL_SIZE_BY_DURATION': [  # (max utterance seconds, model size), checked in order
+        (8, 'small'),           # Short commands: a larger model still answers quickly
+        (30, 'base'),
+        (None, 'tiny'),         # Long recordings: the smallest model bounds latency
+    ],
+}
+
+# ===========================
+# Batch Transcription Configuration
+# ===========================
+
+BATCH_STT_CONFIG = {
+    'EXTENSIONS': ['.wav', '.mp3', '.flac', '.m4a', '.ogg'],  # Audio types picked up from a directory
+    'WORKERS': max(1, (os.cpu_count() or 1) // 2),  # Processes, each holding one loaded model
+    'BUCKET_SIZE': 8,           # Files of similar duration transcribed per task
+    'OUTPUT_FILE': CACHE_DIR / 'transcripts.jsonl',  # One record per file; also used to resume
+    'DOC_PREFIX': 'transcripts/',  # Prefix of the document names transcripts are stored under
 }
 
 # ===========================
@@ -81,12 +105,123 @@ TTS_CONFIG = {
     'VOLUME': 1.0,              # Volume level (0.0 to 1.0)
 }
 
+# ===========================
+# Voice Pipeline Configuration
+# ===========================
+
+VOICE_CONFIG = {
+    'QUEUE_SIZE': 4,            # Items each stage may have waiting before the stage feeding it blocks
+    'SPEECH_THRESHOLD': 0.02,   # RMS level (full scale = 1.0) counted as speech
+    'MIN_SPEECH_SECONDS': 0.15, # Sustained speech needed to start an utterance (ignores clicks)
+    'SILENCE_SECONDS': 0.8,     # Trailing silence that ends an utterance
+    'MAX_UTTERANCE_SECONDS': 30,  # Longer speech is cut into several utterances
+    'PRE_ROLL_SECONDS': 0.3,    # Audio kept from before the speech onset, so the first word is not clipped
+    'BARGE_IN': True,           # Let the user interrupt the assistant by speaking over it
+    'BARGE_IN_THRESHOLD': 0.06, # Higher level required while the assistant speaks, so its own voice is ignored
+    'BARGE_IN_SECONDS': 0.3,    # Sustained speech needed to interrupt playback
+}
+
 # ===========================
 # RAG Configuration
 # ===========================
 
 RAG_CONFIG = {
     'TOP_K': 5,                 # Number of top documents to retrieve for context
+    'EMBED_BATCH_SIZE': 64,     # Number of documents encoded per embedding model call
+    'BUILD_CHUNK_SIZE': 1024,   # Documents read and embedded at a time during a full index rebuild
+    'EMBEDDING_MODEL': 'all-MiniLM-L6-v2',  # SentenceTransformer model used for documents and queries
+    'EMBEDDING_BACKEND': 'torch',  # 'torch' (full precision) or 'onnx-int8' (quantized ONNX Runtime, faster on CPU)
+    'EMBED_THREADS': 0,         # Intra-op threads for the 'onnx-int8' backend; 0 uses every core
+    'ONNX_DIR': CACHE_DIR / 'onnx',  # Exported ONNX models and tokenizers
+    'PARITY_MIN_COSINE': 0.99,  # Reject an ONNX export whose embeddings fall below this cosine similarity to PyTorch
+    'FILTER_EXACT_LIMIT': 10000,  # Filtered searches matching at most this many documents scan them exactly
+    'NUM_SHARDS': 0,            # Worker processes each holding part of the index; 0 keeps one in-process index
+}
+
+# ===========================
+# Vector Database Configuration
+# ===========================
+
+VECTOR_DB_CONFIG = {
+    'DTYPE': 'float32',         # Stored precision of saved vectors: 'float32' or 'float16' (half the size)
+}
+
+# ===========================
+# Response Cache Configuration
+# ===========================
+
+RESPONSE_CACHE_CONFIG = {
+    'ENABLED': True,            # Reuse answers for near-duplicate questions
+    'SIMILARITY_THRESHOLD': 0.92,  # Minimum cosine similarity between query embeddings for a hit
+    'SCOPE': 'user',            # 'user' = answers are only reused for the same user, 'global' = shared
+    'CANDIDATES': 5,            # Nearest cached queries checked per lookup
+    'MAX_ENTRIES': 10000,       # Oldest entries are evicted beyond this
+    'TTL': None,                # Seconds before an entry expires; None keeps entries until invalidated
+    'SAVE_EVERY': 20,           # Persist the cache after this many new entries (and at exit)
+    'CACHE_SUBDIR': 'response_cache',  # Directory under CACHE_DIR holding the cache files
+}
+
+# ===========================
+# Document Store Configuration
+# ===========================
+
+DOCUMENT_STORE_CONFIG = {
+    'COMPRESSION_LEVEL': 6,     # zlib level for document blobs (1 = fastest, 9 = smallest)
+    'JOURNAL_COMPACT_MIN': 10000,  # Fold the metadata journal into the index once it holds this many records and as many as the index
+}
+
+# ===========================
+# Document Ingest Configuration
+# ===========================
+
+INGEST_CONFIG = {
+    'EXTENSIONS': ['.txt', '.pdf', '.md'],  # File types picked up by bulk import
+    'WORKERS': os.cpu_count() or 1,         # Processes used for text extraction
+    'COMMIT_BATCH_SIZE': 256,               # Documents written and indexed per batch
+    'CHECKPOINT_SECONDS': 300,              # How often the index files and progress record are saved during an import
+    'STATE_DIR': CACHE_DIR / 'ingest_state',  # Per-user progress records used to resume imports
+}
+
+# ===========================
+# Near-Duplicate Detection Configuration
+# ===========================
+
+DEDUP_CONFIG = {
+    'ENABLED': True,            # Check imported documents against earlier ones before embedding them
+    'MODE': 'collapse',         # 'collapse' skips near-duplicates; 'flag' stores and indexes them but records the match
+    'THRESHOLD': 0.85,          # Estimated Jaccard similarity of word shingles at which documents count as duplicates
+    'SHINGLE_SIZE': 5,          # Words per shingle
+    'NUM_PERM': 128,            # MinHash signature length
+    'BANDS': 16,                # LSH bands (NUM_PERM must be divisible by BANDS)
+    'SEED': 1,                  # Seed of the MinHash hash family; changing it invalidates the index
+    'INDEX_DIR': CACHE_DIR / 'dedup',  # Per-user signature and band index files
+}
+
+# ===========================
+# GUI Configuration
+# ===========================
+
+GUI_CONFIG = {
+    'WORKERS': 1,               # Background threads running turns and document jobs (TheraxusAI is not thread-safe)
+    'UI_POLL_MS': 50,           # How often the Tk main loop drains queued UI updates
+    'MAX_UPDATES_PER_POLL': 500,  # Cap on queued updates applied per drain, keeps each drain short
+    'MAX_LINES': 5000,          # Oldest lines are trimmed from the response area beyond this
+}
+
+# ===========================
+# Metrics Configuration
+# ===========================
+
+METRICS_CONFIG = {
+    'ENABLED': True,                          # Record per-stage latency spans and counters
+    'EXPORT_PATH': LOGS_DIR / 'metrics',      # Base path; '.prom' and/or '.json' is appended
+    'EXPORT_FORMATS': ['prometheus', 'json'], # Any of 'prometheus', 'json'
+    'EXPORT_INTERVAL': 10,                    # Minimum seconds between metrics file rewrites
+    'LATENCY_BUCKETS': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],  # Histogram bounds (s)
+    'RESERVOIR_SIZE': 1024,                   # Recent samples kept per stage for percentiles
+    'RECENT_SPANS': 200,                      # Recent spans kept for the JSON export
+    'PROFILE_NEXT_TURN': False,               # Profile the first turn with cProfile and tracemalloc
+    'PROFILE_DIR': LOGS_DIR / 'profiles',     # Where turn profiles are written
 }
 
 # ===========================
@@ -105,6 +240,15 @@ LOGGING_CONFIG = {
 # You can modify the above configurations to customize the behavior of Theraxus AI.
 # For example:
 # - To change the Whisper model size, adjust 'MODEL_NAME' in STT_CONFIG.
+# - To trade STT speed for accuracy on CPU, adjust 'BACKEND', 'COMPUTE_TYPE' and 'BEAM_SIZE' in STT_CONFIG.
 # - To alter the speech rate or volume, modify 'RATE' and 'VOLUME' in TTS_CONFIG.
+# - To tune when the voice loop treats sound as speech, or how easily the user can interrupt it, see VOICE_CONFIG.
 # - To retrieve a different number of documents, change 'TOP_K' in RAG_CONFIG.
+# - To speed up embedding on CPU, set 'EMBEDDING_BACKEND' in RAG_CONFIG to 'onnx-int8'.
+# - To inspect where a turn's time goes, read logs/metrics.prom or logs/metrics.json, or set
+#   'PROFILE_NEXT_TURN' in METRICS_CONFIG to capture a cProfile/tracemalloc report of one turn.
+# - To transcribe recorded audio in bulk, see BATCH_STT_CONFIG and batch_transcribe.py.
+# - To reuse answers for reworded questions, tune 'SIMILARITY_THRESHOLD' and 'SCOPE' in RESPONSE_CACHE_CONFIG.
+# - To tune bulk document imports, adjust 'WORKERS' and 'COMMIT_BATCH_SIZE' in INGEST_CONFIG.
+# - To control how near-duplicate documents are handled on import, see DEDUP_CONFIG.
 # - To support a new user, call ensure_user_directories(user_id) to set up user-specific directories.
@@ -1,9 +1,17 @@
 # database_manager.py
 
+import hashlib
 import json
+import mmap
+import os
+import time
+import zlib
 from pathlib import Path
-from typing import List, Dict
-from config import DATA_DIR, CONVERSATIONS_DIR, DOCS_DIR, VECTOR_DB_DIR, CACHE_DIR, LOGGING_CONFIG
+from typing import Iterator, List, Dict, Optional, Tuple
+from config import DATA_DIR, CONVERSATIONS_DIR, DOCS_DIR, VECTOR_DB_DIR, USERS_DIR, CACHE_DIR, LOGGING_CONFIG, DOCUMENT_STORE_CONFIG
+from metrics import timed
+from vector_store import VectorStore, convert_json
+import numpy as np
 import logging
 
 # ===========================
@@ -23,23 +31,51 @@ logger = logging.getLogger(__name__)
 # ===========================
 
 class DatabaseManager:
-    def __init__(self):
-        """Initialize the Database Manager with necessary file paths."""
-        self.conversations_path = CONVERSATIONS_DIR / 'conversations.json'
-        self.docs_path = DOCS_DIR / 'documents.json'
-        self.vector_db_path = VECTOR_DB_DIR / 'vector_db.json'
+    def __init__(self, data_dir: Optional[Path] = None):
+        """
+        Initialize the Database Manager with necessary file paths.
+        
+        :param data_dir: Optional root for the database files, used to run against an isolated
+                         data directory (e.g. benchmarks). Defaults to the directories in config.py.
+        """
+        conversations_dir = Path(data_dir) / 'conversations' if data_dir else CONVERSATIONS_DIR
+        docs_dir = Path(data_dir) / 'docs' if data_dir else DOCS_DIR
+        vector_db_dir = Path(data_dir) / 'vector_db' if data_dir else VECTOR_DB_DIR
+        self.users_dir = Path(data_dir) / 'users' if data_dir else USERS_DIR
+        for directory in [conversations_dir, docs_dir, vector_db_dir]:
+            directory.mkdir(parents=True, exist_ok=True)
+
+        self.conversations_path = conversations_dir / 'conversations.json'
+        self.docs_index_path = docs_dir / 'documents_index.json'
+        self.docs_journal_path = docs_dir / 'documents_index.journal'
+        self.blobs_dir = docs_dir / 'blobs'
+        self.legacy_docs_path = docs_dir / 'documents.json'
+        self.vector_db_dir = vector_db_dir
+        self.legacy_vector_db_path = vector_db_dir / 'vector_db.json'
+        self._metadata, self._metadata_stamp = {}, None
+        self._journal_records, self._journal_end = 0, 0  # Records replayed from the journal, and where they end
+        self._vector_stores: Dict[str, VectorStore] = {}
 
         # Initialize JSON files if they don't exist
-        for path in [self.conversations_path, self.docs_path, self.vector_db_path]:
+        for path in [self.conversations_path, self.docs_index_path]:
             if not path.exists():
                 with open(path, 'w') as f:
                     json.dump({}, f)
                 logger.info(f"Created new database file: {path}")
 
+        # Older versions stored document contents inline in documents.json
+        if self.legacy_docs_path.exists():
+            self._migrate_legacy_documents()
+
+        # Older versions stored vectors as a JSON dict in vector_db.json
+        if self.legacy_vector_db_path.exists():
+            self._migrate_legacy_vector_db()
+
     # ===========================
     # Chat History Management (Multi-User)
     # ===========================
 
+    @timed('db.get_chat_history')
     def get_chat_history(self, user_id: str) -> List[Dict]:
         """
         Retrieve chat history for a specific user.
@@ -57,6 +93,7 @@ class DatabaseManager:
             logger.error(f"Error retrieving chat history for user {user_id}: {e}")
             return []
 
+    @timed('db.add_chat')
     def add_chat(self, user_id: str, role: str, content: str):
         """
         Add a chat entry for a specific user.
@@ -87,83 +124,308 @@ class DatabaseManager:
     # Document Management (Multi-User Placeholder)
     # ===========================
 
+    # Documents are split into a small metadata index (documents_index.json) and
+    # zlib-compressed, content-addressed blobs under docs/blobs/, named by the SHA-256
+    # of the content. Listing documents only reads the metadata; contents are
+    # decompressed one document at a time, on demand. Batches append their metadata to
+    # documents_index.journal, which is folded into the index once it has grown as
+    # large, so bulk imports do not rewrite the whole index per batch.
+
+    def _metadata_files_stamp(self) -> Tuple:
+        """Identify the current versions of the metadata index and journal."""
+        stat = self.docs_index_path.stat()
+        journal_size = self.docs_journal_path.stat().st_size if self.docs_journal_path.exists() else 0
+        return stat.st_mtime_ns, stat.st_size, journal_size
+
+    def _load_metadata(self) -> Dict[str, Dict]:
+        """Return the document metadata index with the journal applied, re-reading them only if they changed."""
+        stamp = self._metadata_files_stamp()
+        if stamp != self._metadata_stamp:
+            with open(self.docs_index_path, 'r') as f:
+                metadata = json.load(f)
+            records = end = 0
+            if self.docs_journal_path.exists():
+                with open(self.docs_journal_path, 'rb') as f:
+                    for line in f:
+                        try:
+                            entries = json.loads(line)
+                        except ValueError:
+                            break  # A batch cut short by a crash was never committed
+                        metadata.update(entries)
+                        records += len(entries)
+                        end += len(line)
+            self._metadata, self._metadata_stamp = metadata, stamp
+            self._journal_records, self._journal_end = records, end
+        return self._metadata
+
+    def _append_metadata(self, entries: Dict[str, Dict]):
+        """Commit metadata for a batch of documents by appending it to the journal."""
+        metadata = self._load_metadata()
+        line = (json.dumps(entries) + "\n").encode('utf-8')
+        with open(self.docs_journal_path, 'ab') as f:
+            f.truncate(self._journal_end)  # Drop a partial batch left by a crash
+            f.write(line)
+        metadata.update(entries)
+        self._journal_records += len(entries)
+        self._journal_end += len(line)
+        self._metadata_stamp = self._metadata_files_stamp()
+        if self._journal_records >= max(DOCUMENT_STORE_CONFIG['JOURNAL_COMPACT_MIN'], len(metadata)):
+            self._save_metadata(metadata)
+
+    def _save_metadata(self, metadata: Dict[str, Dict]):
+        """Atomically replace the document metadata index, folding in (and emptying) the journal."""
+        tmp_path = self.docs_index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(metadata, f, indent=4)
+        os.replace(tmp_path, self.docs_index_path)
+        # Replaying the journal over the new index would be harmless, so a crash here loses nothing
+        self.docs_journal_path.unlink(missing_ok=True)
+        self._metadata, self._metadata_stamp = metadata, self._metadata_files_stamp()
+        self._journal_records, self._journal_end = 0, 0
+
+    def _blob_path(self, content_hash: str) -> Path:
+        """Location of the compressed blob for a content hash."""
+        return self.blobs_dir / content_hash[:2] / f"{content_hash}.zlib"
+
+    def _write_blob(self, content: str) -> Dict:
+        """Store content as a compressed blob (once per distinct content) and return its metadata."""
+        data = content.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(content_hash)
+        if not blob_path.exists():
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob_path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(data, DOCUMENT_STORE_CONFIG['COMPRESSION_LEVEL']))
+            os.replace(tmp_path, blob_path)
+        return {'size': len(data), 'hash': content_hash}
+
+    def _read_blob(self, content_hash: str) -> str:
+        """Decompress a blob straight from a read-only memory map of the file."""
+        with open(self._blob_path(content_hash), 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return zlib.decompress(mapped).decode('utf-8')
+
+    def _migrate_legacy_documents(self):
+        """Convert a documents.json holding inline contents into metadata plus blobs."""
+        with open(self.legacy_docs_path, 'r') as f:
+            legacy = json.load(f)
+        if legacy:
+            self.add_documents({name: doc['content'] for name, doc in legacy.items()})
+        os.replace(self.legacy_docs_path, self.legacy_docs_path.with_suffix('.json.migrated'))
+        logger.info(f"Migrated {len(legacy)} documents from {self.legacy_docs_path} to the blob store")
+
+    @timed('db.list_documents')
+    def list_documents(self, user_id: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        List documents without loading their contents.
+        
+        :param user_id: If given, only documents owned by this user or by "global"; otherwise all documents.
+        :return: Mapping of document name to metadata ('user', 'size', 'hash', 'mtime', and 'tags' if set).
+        """
+        try:
+            metadata = self._load_metadata()
+            if user_id is None:
+                return dict(metadata)
+            # list() snapshots the items, as a concurrent batch may be adding to the index
+            return {name: meta for name, meta in list(metadata.items()) if meta['user'] in (user_id, "global")}
+        except Exception as e:
+            logger.error(f"Error listing documents for user {user_id}: {e}")
+            return {}
+
+    def get_metadata(self, doc_names: List[str]) -> Dict[str, Dict]:
+        """
+        Look up the metadata of specific documents without copying the whole index.
+        
+        :param doc_names: Document names; unknown names are left out.
+        :return: Mapping of document name to metadata, as returned by list_documents.
+        """
+        try:
+            metadata = self._load_metadata()
+            return {name: metadata[name] for name in doc_names if name in metadata}
+        except Exception as e:
+            logger.error(f"Error reading document metadata: {e}")
+            return {}
+
+    @timed('db.get_document_content')
+    def get_document_content(self, doc_name: str) -> Optional[str]:
+        """
+        Read one document's content on demand.
+        
+        :param doc_name: The name of the document.
+        :return: The document text, or None if it does not exist.
+        """
+        try:
+            meta = self._load_metadata().get(doc_name)
+            return self._read_blob(meta['hash']) if meta else None
+        except Exception as e:
+            logger.error(f"Error reading document {doc_name}: {e}")
+            return None
+
+    def iter_documents(self, doc_names: Optional[List[str]] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Stream document contents one at a time, so callers never hold the whole corpus.
+        
+        :param doc_names: Documents to read, in order; defaults to every document.
+        :return: Iterator of (document name, content).
+        """
+        metadata = self._load_metadata()
+        for doc_name in (doc_names if doc_names is not None else list(metadata)):
+            meta = metadata.get(doc_name)
+            if meta is not None:
+                yield doc_name, self._read_blob(meta['hash'])
+
+    @timed('db.get_documents')
     def get_documents(self, user_id: str = "global") -> Dict:
         """
         Retrieve all uploaded documents, with a placeholder for multi-user support.
         
+        This loads every document's content; prefer `list_documents` for names and
+        metadata, and `iter_documents` to process contents.
+        
         :param user_id: The unique identifier for the user (or "global" for shared documents).
         :return: Dictionary containing all documents.
         """
         try:
-            with open(self.docs_path, 'r') as f:
-                data = json.load(f)
-            
             # Placeholder for user-specific documents (currently retrieving all)
-            # In the future, document retrieval can be tailored per user by storing documents separately.
+            data = {doc_name: {'content': content} for doc_name, content in self.iter_documents()}
             logger.info(f"Retrieved documents for user {user_id}")
             return data
         except Exception as e:
             logger.error(f"Error retrieving documents for user {user_id}: {e}")
             return {}
 
-    def add_document(self, doc_name: str, content: str, user_id: str = "global"):
+    @timed('db.add_document')
+    def add_document(self, doc_name: str, content: str, user_id: str = "global", tags: Optional[List[str]] = None):
         """
         Add a new document for a user or globally accessible.
         
         :param doc_name: The name of the document to be added.
         :param content: The content of the document.
         :param user_id: The unique identifier for the user (or "global" for shared documents).
+        :param tags: Optional tags that searches can filter on.
         """
+        if self.add_documents({doc_name: content}, user_id=user_id, tags=tags):
+            logger.info(f"Added new document: {doc_name} for user {user_id}")
+
+    @timed('db.add_documents')
+    def add_documents(self, documents: Dict[str, str], user_id: str = "global", tags: Optional[List[str]] = None) -> bool:
+        """
+        Add many documents with a single update of the metadata index.
+        
+        Blobs are written first and the batch's metadata is then appended to the journal
+        as one line, so a batch is either fully visible or not at all. Names share one
+        namespace, so a batch that would replace another user's document is refused.
+        
+        :param documents: Mapping of document name to document content.
+        :param user_id: The unique identifier for the user (or "global" for shared documents).
+        :param tags: Optional tags applied to every document in the batch.
+        :return: True if the batch was committed, False otherwise.
+        """
+        if not documents:
+            return True
         try:
-            with open(self.docs_path, 'r') as f:
-                data = json.load(f)
-            
-            # Placeholder for user-specific document management
-            # Currently, documents are shared across users; can be changed to manage user-specific documents.
-            data[doc_name] = {'content': content}
+            metadata = self._load_metadata()
+            taken = [name for name in documents if name in metadata and metadata[name]['user'] != user_id]
+            if taken:
+                logger.error(f"Refusing document batch for user {user_id}: {', '.join(taken[:5])} "
+                             f"{'belongs' if len(taken) == 1 else 'belong'} to another user")
+                return False
+            entries, replaced = {}, set()
+            now = time.time()
+            for doc_name, content in documents.items():
+                if doc_name in metadata:
+                    replaced.add(metadata[doc_name]['hash'])
+                entries[doc_name] = {'user': user_id, **self._write_blob(content), 'mtime': now}
+                if tags:
+                    entries[doc_name]['tags'] = sorted(set(tags))
+            self._append_metadata(entries)
 
-            with open(self.docs_path, 'w') as f:
-                json.dump(data, f, indent=4)
-            
-            logger.info(f"Added new document: {doc_name} for user {user_id}")
+            # Remove blobs no document points to any more
+            if replaced:
+                referenced = {meta['hash'] for meta in self._metadata.values()}
+                for content_hash in replaced - referenced:
+                    self._blob_path(content_hash).unlink(missing_ok=True)
+
+            logger.info(f"Added {len(documents)} documents in one batch for user {user_id}")
+            return True
         except Exception as e:
-            logger.error(f"Error adding document {doc_name} for user {user_id}: {e}")
+            logger.error(f"Error adding document batch for user {user_id}: {e}")
+            return False
 
     # ===========================
     # Vector Database Management (Multi-User Placeholder)
     # ===========================
 
+    # Vectors are kept per user in a binary VectorStore (vectors.npy + ids.txt): the
+    # shared store under vector_db/, and each user's under users/<user_id>/vector_db/.
+
+    def _vector_store(self, user_id: str) -> VectorStore:
+        """Return the (cached) binary vector store for a user, or the shared one for "global"."""
+        if user_id not in self._vector_stores:
+            directory = self.vector_db_dir if user_id == "global" else self.users_dir / user_id / 'vector_db'
+            self._vector_stores[user_id] = VectorStore(directory)
+        return self._vector_stores[user_id]
+
+    def _migrate_legacy_vector_db(self):
+        """Convert vector_db.json into binary stores; a dict of dicts is treated as one store per user."""
+        with open(self.legacy_vector_db_path, 'r') as f:
+            legacy = json.load(f)
+        if legacy and all(isinstance(value, dict) for value in legacy.values()):
+            for user_id, vectors in legacy.items():
+                if vectors:
+                    self._vector_store(user_id).write(vectors)
+        elif legacy:
+            convert_json(self.legacy_vector_db_path, self._vector_store("global").directory)
+        os.replace(self.legacy_vector_db_path, self.legacy_vector_db_path.with_suffix('.json.migrated'))
+        logger.info(f"Migrated {self.legacy_vector_db_path} to the binary vector store")
+
+    @timed('db.save_vector_db')
     def save_vector_db(self, vectors: Dict, user_id: str = "global"):
         """
-        Save the vector database for a user or globally accessible.
+        Replace the vector database for a user or globally accessible.
         
-        :param vectors: The dictionary containing vector data to be saved.
+        :param vectors: Mapping of vector id to 1-D vector (list or array).
         :param user_id: The unique identifier for the user (or "global" for shared vector data).
         """
         try:
-            # Placeholder for saving user-specific vector database
-            # Currently, all vectors are saved in one file; can be adapted for user-specific vector databases.
-            with open(self.vector_db_path, 'w') as f:
-                json.dump(vectors, f)
+            self._vector_store(user_id).write(vectors)
             logger.info(f"Vector database updated for user {user_id}")
         except Exception as e:
             logger.error(f"Error saving vector database for user {user_id}: {e}")
 
-    def load_vector_db(self, user_id: str = "global") -> Dict:
+    @timed('db.append_vectors')
+    def append_vectors(self, vectors: Dict, user_id: str = "global"):
+        """
+        Add or overwrite vectors in place, without rewriting the rest of the database.
+        
+        :param vectors: Mapping of vector id to 1-D vector (list or array).
+        :param user_id: The unique identifier for the user (or "global" for shared vector data).
+        """
+        try:
+            self._vector_store(user_id).append(vectors)
+            logger.info(f"Appended {len(vectors)} vectors for user {user_id}")
+        except Exception as e:
+            logger.error(f"Error appending vectors for user {user_id}: {e}")
+
+    @timed('db.load_vector_db')
+    def load_vector_db(self, user_id: str = "global") -> Tuple[List[str], np.ndarray]:
         """
         Load the vector database for a user or globally accessible.
         
+        The matrix is memory-mapped, so loading is constant-time and rows are only read
+        from disk when accessed.
+        
         :param user_id: The unique identifier for the user (or "global" for shared vector data).
-        :return: Dictionary containing the vector database.
+        :return: (ids, matrix), where row i of the read-only matrix is the vector for ids[i].
         """
         try:
-            with open(self.vector_db_path, 'r') as f:
-                data = json.load(f)
+            ids, matrix = self._vector_store(user_id).load()
             logger.info(f"Vector database loaded for user {user_id}")
-            return data
+            return ids, matrix
         except Exception as e:
             logger.error(f"Error loading vector database for user {user_id}: {e}")
-            return {}
+            return [], np.empty((0, 0), dtype=np.float32)
 
     # ===========================
     # Instructions for Modifications
@@ -178,3 +440,7 @@ class DatabaseManager:
     # - Implement additional methods for deleting chats or documents.
     # - Enhance user-specific document management by creating a dedicated document structure per user.
     # - Integrate with a more robust database system like SQLite or PostgreSQL if needed for scalability.
+    # - Documents are stored as metadata plus compressed blobs; use `list_documents` for listings and
+    #   `iter_documents` for processing, since `get_documents` loads every document into memory.
+    # - Vectors are stored per user in binary files (see vector_store.py); use `append_vectors` for
+    #   incremental additions instead of re-saving the whole database.
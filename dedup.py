@@ -0,0 +1,230 @@
+# dedup.py
+
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config import DEDUP_CONFIG
+from vector_store import VectorStore
+import logging
+
+# ===========================
+# Logger Setup
+# ===========================
+
+logger = logging.getLogger(__name__)
+
+# Universal hash family h(x) = (a * x + b) mod P; a 31-bit prime keeps a * x inside uint64
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(DEDUP_CONFIG['SEED'])
+_PERM_A = _rng.randint(1, (1 << 31) - 1, size=DEDUP_CONFIG['NUM_PERM']).astype(np.uint64)
+_PERM_B = _rng.randint(0, (1 << 31) - 1, size=DEDUP_CONFIG['NUM_PERM']).astype(np.uint64)
+
+# ===========================
+# MinHash Signatures
+# ===========================
+
+def shingles(text: str) -> List[str]:
+    """Overlapping word n-grams of the lower-cased text ('SHINGLE_SIZE' words each)."""
+    words = re.findall(r"\w+", text.lower())
+    size = DEDUP_CONFIG['SHINGLE_SIZE']
+    if len(words) <= size:
+        return [" ".join(words)]
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+def is_signable(text: str) -> bool:
+    """
+    Whether a text is long enough to fill at least one shingle.
+
+    Shorter texts (including empty or whitespace-only ones) collapse to a single shingle
+    and would all match each other, so they are left out of near-duplicate detection.
+    """
+    return len(re.findall(r"\w+", text)) >= DEDUP_CONFIG['SHINGLE_SIZE']
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    Compute the MinHash signature of a text.
+
+    Safe to call in worker processes: the hash family is derived from 'SEED', so every
+    process produces the same signature for the same text.
+
+    :param text: Document text.
+    :return: 'NUM_PERM' uint32 minimum hash values.
+    """
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in set(shingles(text))),
+                         dtype=np.uint64) % MERSENNE_PRIME
+    signature = np.full(len(_PERM_A), MERSENNE_PRIME, dtype=np.uint64)
+    # Blocks bound the (NUM_PERM x block) intermediate for very long documents
+    for start in range(0, len(hashes), 4096):
+        block = hashes[start:start + 4096]
+        permuted = (_PERM_A[:, None] * block[None, :] + _PERM_B[:, None]) % MERSENNE_PRIME
+        np.minimum(signature, permuted.min(axis=1), out=signature)
+    return signature.astype(np.uint32)
+
+def band_keys(signature: np.ndarray) -> np.ndarray:
+    """Hash each of the signature's 'BANDS' bands to a stable 64-bit bucket key."""
+    bands = signature.reshape(DEDUP_CONFIG['BANDS'], -1)
+    return np.array([int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), 'little')
+                     for band in bands], dtype=np.uint64)
+
+# ===========================
+# NearDuplicateIndex Class
+# ===========================
+
+class NearDuplicateIndex:
+    def __init__(self, directory: Path):
+        """
+        Persistent MinHash LSH index over the documents ingested so far.
+
+        Signatures and per-band bucket keys are stored as binary matrices (see
+        vector_store.py) and appended to as documents arrive, so adding documents never
+        re-signs the existing corpus. Two documents become candidates when any band
+        matches; a candidate is a near-duplicate when the fraction of equal signature
+        values (the Jaccard estimate) reaches 'THRESHOLD'.
+
+        :param directory: Directory for this index's files, under DEDUP_CONFIG['INDEX_DIR'].
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.meta_path = self.directory / 'index.json'
+        self.signature_store = VectorStore(self.directory / 'signatures', dtype='uint32')
+        self.band_store = VectorStore(self.directory / 'bands', dtype='uint64')
+        self.lock = threading.Lock()
+
+        self.duplicates: Dict[str, str] = {}      # Name -> the document it duplicates
+        self.buckets = defaultdict(list)          # (band, key) -> names
+        self.keys: Dict[str, np.ndarray] = {}     # Name -> its band keys, to unlink when replaced
+        self.pending: Dict[str, np.ndarray] = {}  # Added since the last save
+        self._load()
+
+    # ===========================
+    # Persistence
+    # ===========================
+
+    def _settings(self) -> Dict:
+        return {name: DEDUP_CONFIG[name] for name in ('NUM_PERM', 'BANDS', 'SHINGLE_SIZE', 'SEED')}
+
+    def _load(self):
+        """Load the stored band keys into memory, discarding an index built with other settings."""
+        if self.meta_path.exists():
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta['settings'] == self._settings():
+                self.duplicates = meta['duplicates']
+            else:
+                logger.warning(f"Near-duplicate index at {self.directory} uses other settings; starting empty.")
+                self.signature_store.write_matrix([], np.empty((0, 0)))
+                self.band_store.write_matrix([], np.empty((0, 0)))
+        names, keys = self.band_store.load()
+        for name, row in zip(names, keys):
+            self._link(name, np.array(row))
+        signature_ids, self.signatures = self.signature_store.load()
+        self.signature_rows = {name: row for row, name in enumerate(signature_ids)}
+        self.saved_duplicates = dict(self.duplicates)
+
+    def save(self):
+        """Append pending signatures and band keys to disk and persist the duplicate map."""
+        with self.lock:
+            if self.pending:
+                self.signature_store.append(self.pending)
+                self.band_store.append({name: self.keys[name] for name in self.pending})
+                # Replaced documents were overwritten in their rows; new ones were appended in order
+                for name in self.pending:
+                    if name not in self.signature_rows:
+                        self.signature_rows[name] = len(self.signature_rows)
+                self.pending = {}
+                self.signatures = self.signature_store.matrix()
+            tmp_path = self.meta_path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump({'settings': self._settings(), 'duplicates': self.duplicates}, f)
+            os.replace(tmp_path, self.meta_path)
+            self.saved_duplicates = dict(self.duplicates)
+
+    def discard_pending(self):
+        """Forget documents added since the last save, e.g. after their batch failed to commit."""
+        with self.lock:
+            for name in self.pending:
+                self._unlink(name)
+                row = self.signature_rows.get(name)
+                if row is not None:  # Restore the saved version of a replaced document
+                    self._link(name, band_keys(np.asarray(self.signatures[row])))
+            self.pending = {}
+            self.duplicates = dict(self.saved_duplicates)
+
+    # ===========================
+    # Lookup and Insertion
+    # ===========================
+
+    def _link(self, name: str, keys: np.ndarray):
+        self._unlink(name)
+        self.keys[name] = keys
+        for band, key in enumerate(keys.tolist()):
+            self.buckets[(band, key)].append(name)
+
+    def _unlink(self, name: str):
+        keys = self.keys.pop(name, None)
+        if keys is not None:
+            for band, key in enumerate(keys.tolist()):
+                self.buckets[(band, key)].remove(name)
+
+    def _signature_of(self, name: str) -> Optional[np.ndarray]:
+        if name in self.pending:
+            return self.pending[name]
+        row = self.signature_rows.get(name)
+        return None if row is None else np.asarray(self.signatures[row])
+
+    def find(self, signature: np.ndarray, exclude: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """
+        Find the most similar indexed document above 'THRESHOLD'.
+
+        :param signature: MinHash signature of the new document.
+        :param exclude: Name to ignore, so a re-imported document does not match its old version.
+        :return: (name, estimated Jaccard similarity), or None if there is no near-duplicate.
+        """
+        with self.lock:
+            candidates = set()
+            for band, key in enumerate(band_keys(signature).tolist()):
+                candidates.update(self.buckets.get((band, key), ()))
+            candidates.discard(exclude)
+            best = None
+            for name in candidates:
+                similarity = float(np.mean(self._signature_of(name) == signature))
+                if similarity >= DEDUP_CONFIG['THRESHOLD'] and (best is None or similarity > best[1]):
+                    best = (self.duplicates.get(name, name), similarity)
+            return best
+
+    def add(self, name: str, signature: np.ndarray, duplicate_of: Optional[str] = None):
+        """
+        Index a document's signature (kept in memory until `save`).
+
+        :param name: Document name.
+        :param signature: Its MinHash signature.
+        :param duplicate_of: The document it was found to duplicate, if any.
+        """
+        with self.lock:
+            self.pending[name] = signature
+            self._link(name, band_keys(signature))
+            if duplicate_of is None:
+                self.duplicates.pop(name, None)
+            else:
+                self.duplicates[name] = duplicate_of
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# This module detects near-identical documents (revisions, exports, copies) before they are embedded.
+# To modify:
+# - Raise 'THRESHOLD' in DEDUP_CONFIG to only catch closer copies, or lower it to catch looser ones.
+#   'BANDS' sets how likely similar documents are to be compared at all: more bands (fewer rows per
+#   band) find more candidates at the cost of more comparisons.
+# - Changing 'NUM_PERM', 'BANDS', 'SHINGLE_SIZE' or 'SEED' invalidates the stored index; it starts
+#   empty and fills up again as documents are ingested.
+# - Set 'MODE' to 'flag' to keep duplicates searchable and only record them.
+# - Texts with fewer than 'SHINGLE_SIZE' words are never treated as near-duplicates (see is_signable).
@@ -0,0 +1,374 @@
+# document_ingest.py
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from config import DEDUP_CONFIG, INGEST_CONFIG, LOGGING_CONFIG
+from dedup import NearDuplicateIndex, is_signable, minhash_signature
+import logging
+
+# ===========================
+# Logger Setup
+# ===========================
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Text Extraction
+# ===========================
+
+def extract_text(path: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Extract plain text from a .txt, .md or .pdf file.
+
+    Runs inside worker processes, so it only takes and returns picklable values.
+
+    :param path: Path of the file to read.
+    :return: Tuple of (path, extracted text or None, error message or None).
+    """
+    try:
+        suffix = Path(path).suffix.lower()
+        if suffix == '.pdf':
+            try:
+                from pypdf import PdfReader
+            except ImportError:
+                return path, None, "PDF support requires the 'pypdf' package."
+            reader = PdfReader(path)
+            text = "\n".join(page.extract_text() or "" for page in reader.pages)
+        else:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                text = f.read()
+        return path, text, None
+    except Exception as e:
+        return path, None, str(e)
+
+def extract_and_sign(path: str) -> Tuple[str, Optional[str], Optional[str], Optional[np.ndarray]]:
+    """
+    Extract a file's text and compute its MinHash signature in the same worker.
+
+    :param path: Path of the file to read.
+    :return: Tuple of (path, text or None, error message or None, signature or None).
+    """
+    path, text, error = extract_text(path)
+    return path, text, error, (minhash_signature(text) if text is not None else None)
+
+# ===========================
+# DocumentIngestor Class
+# ===========================
+
+class DocumentIngestor:
+    def __init__(self, db_manager, rag, user_id: str = "global", tags: Optional[List[str]] = None):
+        """
+        Initialize the bulk document importer.
+
+        :param db_manager: DatabaseManager used to store document contents.
+        :param rag: RAGOptimizer whose index receives the document embeddings.
+        :param user_id: The unique identifier for the user (or "global" for shared documents).
+        :param tags: Optional tags applied to every imported document, for filtered searches.
+        """
+        self.db_manager = db_manager
+        self.rag = rag
+        self.user_id = user_id
+        self.tags = tags
+        # Each user has their own record, as a file imported by one user is not in another's documents
+        self.state_path = Path(INGEST_CONFIG['STATE_DIR']) / f"{user_id}.json"
+        self.state = self._load_state()
+
+        # Near-duplicates are looked for among the user's own and the shared documents
+        self.dedup_indexes = []
+        if DEDUP_CONFIG['ENABLED']:
+            self.dedup_indexes = [NearDuplicateIndex(DEDUP_CONFIG['INDEX_DIR'] / user_id)]
+            if user_id != "global":
+                self.dedup_indexes.append(NearDuplicateIndex(DEDUP_CONFIG['INDEX_DIR'] / "global"))
+        self.duplicates_found = 0
+
+    # ===========================
+    # Resume State
+    # ===========================
+
+    def _load_state(self) -> Dict:
+        """Load the record of files this user already imported."""
+        if not self.state_path.exists():
+            return {}
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading ingest state, starting fresh: {e}")
+            return {}
+
+    def _save_state(self):
+        """Atomically persist the import record."""
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=4)
+        os.replace(tmp_path, self.state_path)
+
+    def _checkpoint(self):
+        """Save the index, then record the files it now holds as imported."""
+        self.rag.flush()
+        self._save_state()
+
+    def _is_done(self, path: Path) -> bool:
+        """Check whether a file was imported and has not changed since."""
+        entry = self.state.get(str(path.resolve()))
+        if not entry:
+            return False
+        stat = path.stat()
+        return entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size
+
+    # ===========================
+    # File Discovery
+    # ===========================
+
+    def find_files(self, directory: Path) -> List[Path]:
+        """
+        Recursively list importable files under a directory.
+
+        :param directory: Root directory to walk.
+        :return: Sorted list of file paths with a supported extension.
+        """
+        extensions = {ext.lower() for ext in INGEST_CONFIG['EXTENSIONS']}
+        return sorted(
+            path for path in Path(directory).rglob('*')
+            if path.is_file() and path.suffix.lower() in extensions
+        )
+
+    # ===========================
+    # Import
+    # ===========================
+
+    def ingest_directory(self, directory, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+        """
+        Import every supported file under a directory.
+
+        Documents are named by their path relative to the directory.
+
+        :param directory: Root directory to walk.
+        :param progress: Optional callback receiving (processed, total) after each batch.
+        :return: Counts of imported, skipped, failed and near-duplicate files.
+        """
+        directory = Path(directory)
+        files = {path: path.relative_to(directory).as_posix() for path in self.find_files(directory)}
+        return self._ingest(files, progress)
+
+    def ingest_files(self, paths: Iterable, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+        """
+        Import an explicit list of files, named by their base name.
+
+        :param paths: Paths of the files to import.
+        :param progress: Optional callback receiving (processed, total) after each batch.
+        :return: Counts of imported, skipped, failed and near-duplicate files.
+        """
+        files = {Path(path): Path(path).name for path in paths}
+        return self._ingest(files, progress)
+
+    def _ingest(self, files: Dict[Path, str], progress: Optional[Callable[[int, int], None]]) -> Dict[str, int]:
+        """Extract, store and index the given files in batches."""
+        pending = [path for path in files if not self._is_done(path)]
+        counts = {'imported': 0, 'skipped': len(files) - len(pending), 'failed': 0, 'duplicates': 0}
+        duplicates_before = self.duplicates_found
+        total = len(pending)
+        logger.info(f"Importing {total} files for user {self.user_id} ({counts['skipped']} already imported).")
+        if not pending:
+            return counts
+
+        batch_size = INGEST_CONFIG['COMMIT_BATCH_SIZE']
+        workers = min(INGEST_CONFIG['WORKERS'], total)
+        batch, signatures = {}, {}
+        processed = 0
+        # Saving the index rewrites all of it, so it is saved at checkpoints rather than per batch
+        next_checkpoint = time.monotonic() + INGEST_CONFIG['CHECKPOINT_SECONDS']
+
+        # Signatures are computed next to extraction, so signing also runs in parallel
+        extract = extract_and_sign if self.dedup_indexes else extract_text
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(extract, [str(path) for path in pending], chunksize=8)
+        else:
+            executor = None
+            results = map(extract, [str(path) for path in pending])
+
+        try:
+            for path_str, text, error, *signature in results:
+                processed += 1
+                path = Path(path_str)
+                if error is not None:
+                    counts['failed'] += 1
+                    logger.error(f"Failed to extract text from {path}: {error}")
+                else:
+                    batch[path] = text
+                    if signature:
+                        signatures[files[path]] = signature[0]
+                if len(batch) >= batch_size:
+                    counts['imported'] += self._commit_batch(batch, files, signatures)
+                    batch, signatures = {}, {}
+                    if time.monotonic() >= next_checkpoint:
+                        self._checkpoint()
+                        next_checkpoint = time.monotonic() + INGEST_CONFIG['CHECKPOINT_SECONDS']
+                    if progress:
+                        progress(processed, total)
+            if batch:
+                counts['imported'] += self._commit_batch(batch, files, signatures)
+                if progress:
+                    progress(processed, total)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            self._checkpoint()
+
+        counts['failed'] += total - counts['failed'] - counts['imported']
+        counts['duplicates'] = self.duplicates_found - duplicates_before
+        logger.info(f"Import finished for user {self.user_id}: {counts}")
+        return counts
+
+    def commit_documents(self, documents: Dict[str, str], signatures: Optional[Dict[str, np.ndarray]] = None,
+                         save: bool = True) -> bool:
+        """
+        Store a batch of already-extracted documents and add them to the index.
+
+        Near-duplicates of earlier documents are dropped (or only recorded, with
+        DEDUP_CONFIG['MODE'] = 'flag') before anything is embedded. A re-imported document
+        is always stored, replacing its previous version, and texts too short to shingle
+        are never treated as duplicates.
+
+        :param documents: Mapping of document name to text.
+        :param signatures: Optional precomputed MinHash signatures by document name.
+        :param save: Save the index files right away; otherwise they are saved by `rag.flush()`.
+        :return: True if the batch was both stored and indexed.
+        """
+        if self.dedup_indexes:
+            documents = self._deduplicate(documents, signatures or {})
+        committed = self._store_and_index(documents, save) if documents else True
+        if self.dedup_indexes:
+            # Signatures are only kept for batches that made it into the store and index
+            if committed:
+                self.dedup_indexes[0].save()
+            else:
+                self.dedup_indexes[0].discard_pending()
+        return committed
+
+    def _store_and_index(self, documents: Dict[str, str], save: bool) -> bool:
+        """Write documents to the store, then embed them into the index."""
+        if not self.db_manager.add_documents(documents, user_id=self.user_id, tags=self.tags):
+            return False
+        try:
+            self.rag.index_documents(documents, user_id=self.user_id, save=save)
+        except Exception as e:
+            logger.error(f"Error indexing document batch for user {self.user_id}: {e}")
+            return False
+        return True
+
+    def _deduplicate(self, documents: Dict[str, str], signatures: Dict[str, np.ndarray]) -> Dict[str, str]:
+        """Record every document in the user's near-duplicate index and return the ones to embed."""
+        kept = {}
+        stored = None  # Names already in the document store, read once a duplicate turns up
+        for doc_name, text in documents.items():
+            if not is_signable(text):
+                kept[doc_name] = text
+                continue
+            signature = signatures.get(doc_name)
+            if signature is None:
+                signature = minhash_signature(text)
+            match = None
+            for index in self.dedup_indexes:
+                match = index.find(signature, exclude=doc_name)
+                if match:
+                    break
+            self.dedup_indexes[0].add(doc_name, signature, duplicate_of=match[0] if match else None)
+            if match is None:
+                kept[doc_name] = text
+                continue
+            self.duplicates_found += 1
+            if stored is None:
+                stored = self.db_manager.list_documents()
+            if DEDUP_CONFIG['MODE'] == 'flag':
+                kept[doc_name] = text
+                logger.warning(f"Document {doc_name} is a near-duplicate of {match[0]} (similarity {match[1]:.2f}).")
+            elif doc_name in stored:
+                # Skipping a re-import would leave its previous content searchable; replace it instead
+                kept[doc_name] = text
+                logger.info(f"Replacing {doc_name}, now a near-duplicate of {match[0]} (similarity {match[1]:.2f}).")
+            else:
+                logger.info(f"Skipping {doc_name}: near-duplicate of {match[0]} (similarity {match[1]:.2f}).")
+        return kept
+
+    def _commit_batch(self, batch: Dict[Path, str], files: Dict[Path, str],
+                      signatures: Optional[Dict[str, np.ndarray]] = None) -> int:
+        """Store one batch of documents and embed it; it is recorded as done at the next checkpoint."""
+        # The store refuses a batch replacing another user's document, so such files fail on their own
+        paths = {files[path]: path for path in batch}
+        for doc_name, meta in self.db_manager.get_metadata(list(paths)).items():
+            if meta['user'] != self.user_id:
+                logger.error(f"Not importing {paths[doc_name]}: document {doc_name} belongs to another user.")
+                del batch[paths[doc_name]]
+        if not self.commit_documents({files[path]: text for path, text in batch.items()}, signatures, save=False):
+            return 0
+
+        duplicates = self.dedup_indexes[0].duplicates if self.dedup_indexes else {}
+        for path in batch:
+            stat = path.stat()
+            self.state[str(path.resolve())] = {
+                'doc_name': files[path],
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+            }
+            if files[path] in duplicates:
+                self.state[str(path.resolve())]['duplicate_of'] = duplicates[files[path]]
+        return len(batch)
+
+# ===========================
+# Main Function for Bulk Import
+# ===========================
+
+def main():
+    """Command-line entry point for importing a directory of documents."""
+    parser = argparse.ArgumentParser(description="Bulk import documents into Theraxus.")
+    parser.add_argument('directory', help="Directory containing .txt, .pdf or .md files")
+    parser.add_argument('--user', default="global", help="User ID that owns the documents")
+    parser.add_argument('--tag', action='append', dest='tags', help="Tag applied to every document (repeatable)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        filename=LOGGING_CONFIG['LOG_FILE'],
+        level=logging.getLevelName(LOGGING_CONFIG['LOG_LEVEL']),
+        format='%(asctime)s:%(levelname)s:%(message)s'
+    )
+
+    # Heavy imports are deferred so worker processes only load what extraction needs
+    from database_manager import DatabaseManager
+    from rag_optimizer import RAGOptimizer
+
+    ingestor = DocumentIngestor(DatabaseManager(), RAGOptimizer(), user_id=args.user, tags=args.tags)
+    counts = ingestor.ingest_directory(
+        args.directory,
+        progress=lambda done, total: print(f"Processed {done}/{total} files", flush=True)
+    )
+    print(f"Imported {counts['imported']} ({counts['duplicates']} near-duplicates), "
+          f"skipped {counts['skipped']}, failed {counts['failed']}.")
+
+# ===========================
+# Entry Point
+# ===========================
+
+if __name__ == "__main__":
+    main()
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# This script imports whole directories of documents into the document store and the RAG index.
+# To modify:
+# - Support new file types by extending `extract_text` and 'EXTENSIONS' in INGEST_CONFIG.
+# - Tune throughput with 'WORKERS' (extraction processes) and 'COMMIT_BATCH_SIZE' (documents per
+#   store write and embedding batch) in INGEST_CONFIG; 'CHECKPOINT_SECONDS' bounds how much work an
+#   interrupted import redoes.
+# - Delete a user's file under 'STATE_DIR' to force a full re-import of their documents.
+# - Near-duplicate handling is configured in DEDUP_CONFIG (see dedup.py).
@@ -0,0 +1,287 @@
+# embedding_backends.py
+
+import json
+import os
+import re
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+from config import RAG_CONFIG
+import logging
+
+# ===========================
+# Logger Setup
+# ===========================
+
+logger = logging.getLogger(__name__)
+
+# Sentences of varied length and topic used to check an exported model against PyTorch
+PARITY_SAMPLES = [
+    "Hello.",
+    "How are you feeling today?",
+    "I have been sleeping badly for the past two weeks and I wake up tired.",
+    "Can you summarize the document I uploaded about quarterly revenue?",
+    "The mitochondria is the powerhouse of the cell.",
+    "Remind me what we talked about yesterday regarding my exercise routine.",
+    "Install the package with pip, then run the GUI from the repository root.",
+    "Approximate nearest neighbour search trades a little recall for a large speed-up "
+    "by navigating a layered proximity graph instead of scanning every vector.",
+    "Ich möchte einen Termin für nächste Woche vereinbaren.",
+    "1234 5678 90",
+    "What is the capital of France?",
+    "Breathing exercises and a consistent bedtime can help with anxiety at night.",
+]
+
+class ParityError(RuntimeError):
+    """Raised when a quantized model drifts too far from its PyTorch reference."""
+
+# ===========================
+# EmbeddingBackend Interface
+# ===========================
+
+class EmbeddingBackend(ABC):
+    """Base class for text embedding engines with SentenceTransformer's `encode` interface."""
+
+    backend_name = "base"
+
+    def __init__(self, model_name: str):
+        """
+        Load the embedding model.
+
+        :param model_name: SentenceTransformer model name, e.g. 'all-MiniLM-L6-v2'.
+        """
+        self.model_name = model_name
+
+    @abstractmethod
+    def get_sentence_embedding_dimension(self) -> int:
+        """Return the embedding dimension."""
+
+    @abstractmethod
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        """
+        Embed texts into L2-normalized float32 vectors.
+
+        :param sentences: A string or list of strings.
+        :param batch_size: Texts run through the model per call.
+        :return: A (len(sentences), dim) float32 array.
+        """
+
+# ===========================
+# PyTorch Backend
+# ===========================
+
+class TorchEmbeddingBackend(EmbeddingBackend):
+    """Full-precision PyTorch inference through sentence-transformers (on the GPU when available)."""
+
+    backend_name = "torch"
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        return np.asarray(self.model.encode(sentences, batch_size=batch_size, normalize_embeddings=True, **kwargs),
+                          dtype=np.float32)
+
+# ===========================
+# ONNX Runtime Backend
+# ===========================
+
+def _export_dir(model_name: str) -> Path:
+    """Directory holding the exported files for one model."""
+    return Path(RAG_CONFIG['ONNX_DIR']) / re.sub(r'[^\w.-]', '_', model_name)
+
+def export_onnx(model_name: str) -> Path:
+    """
+    Export a SentenceTransformer model to ONNX and quantize its weights to int8.
+
+    The transformer is exported once with dynamic batch and sequence axes, then
+    quantized with ONNX Runtime's dynamic int8 quantization. The export is rejected
+    (and removed) if any parity sample drifts below RAG_CONFIG['PARITY_MIN_COSINE']
+    cosine similarity from the PyTorch embedding.
+
+    :param model_name: SentenceTransformer model name.
+    :return: The export directory, containing model-int8.onnx, the tokenizer and export.json.
+    :raises ParityError: If the quantized model fails the parity check; the result is recorded
+                         in parity_failed.json so later starts do not export again.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    export_dir = _export_dir(model_name)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    reference = TorchEmbeddingBackend(model_name)
+    transformer = reference.model[0].auto_model.cpu().eval()
+    tokenizer = reference.model.tokenizer
+    tokenizer.save_pretrained(str(export_dir))
+
+    fp32_path = export_dir / 'model.onnx'
+    int8_path = export_dir / 'model-int8.onnx'
+    sample = tokenizer(["export sample"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    axes = {0: 'batch', 1: 'sequence'}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes={name: axes for name in input_names + ['last_hidden_state']},
+            opset_version=14,
+        )
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    fp32_path.unlink()
+
+    with open(export_dir / 'export.json', 'w') as f:
+        json.dump({
+            'model_name': model_name,
+            'dim': reference.get_sentence_embedding_dimension(),
+            'max_seq_length': reference.model.max_seq_length,
+            'input_names': input_names,
+        }, f, indent=4)
+
+    drift = check_parity(reference, OnnxEmbeddingBackend(model_name), PARITY_SAMPLES)
+    if drift['min_cosine'] < RAG_CONFIG['PARITY_MIN_COSINE']:
+        int8_path.unlink()
+        with open(export_dir / 'parity_failed.json', 'w') as f:
+            json.dump(drift, f, indent=4)
+        raise ParityError(f"Quantized '{model_name}' drifts too far from PyTorch "
+                          f"(min cosine {drift['min_cosine']:.4f} < {RAG_CONFIG['PARITY_MIN_COSINE']})")
+    logger.info(f"Exported int8 ONNX model for '{model_name}' (min cosine {drift['min_cosine']:.4f}).")
+    return export_dir
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """
+    Int8 CPU inference through ONNX Runtime.
+
+    Applies mean pooling and L2 normalization to the transformer output, matching
+    all-MiniLM-L6-v2's SentenceTransformer pipeline. The model is exported on first use.
+    """
+
+    backend_name = "onnx-int8"
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        export_dir = _export_dir(model_name)
+        failed_path = export_dir / 'parity_failed.json'
+        if failed_path.exists():
+            with open(failed_path, 'r') as f:
+                drift = json.load(f)
+            if drift['min_cosine'] < RAG_CONFIG['PARITY_MIN_COSINE']:
+                raise ParityError(f"Quantized '{model_name}' previously failed the parity check "
+                                  f"(min cosine {drift['min_cosine']:.4f}); delete {failed_path} to retry")
+            failed_path.unlink()  # The threshold was lowered since; export again
+        if not (export_dir / 'model-int8.onnx').exists():
+            export_onnx(model_name)
+        with open(export_dir / 'export.json', 'r') as f:
+            self.export_info = json.load(f)
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = RAG_CONFIG['EMBED_THREADS'] or os.cpu_count() or 1
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(str(export_dir / 'model-int8.onnx'), options,
+                                                    providers=['CPUExecutionProvider'])
+        self.tokenizer = AutoTokenizer.from_pretrained(str(export_dir))
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.export_info['dim']
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        embeddings = np.zeros((len(sentences), self.export_info['dim']), dtype=np.float32)
+        # Batch texts of similar length together so little of each batch is padding
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            tokens = self.tokenizer([sentences[i] for i in rows], padding=True, truncation=True,
+                                    max_length=self.export_info['max_seq_length'], return_tensors='np')
+            feeds = {name: tokens[name].astype(np.int64) for name in self.export_info['input_names']}
+            hidden = self.session.run(None, feeds)[0]
+            mask = tokens['attention_mask'][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            embeddings[rows] = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+BACKENDS = {
+    TorchEmbeddingBackend.backend_name: TorchEmbeddingBackend,
+    OnnxEmbeddingBackend.backend_name: OnnxEmbeddingBackend,
+}
+
+def create_embedding_model(name: str = None, model_name: str = None) -> EmbeddingBackend:
+    """
+    Instantiate an embedding backend by name, falling back to PyTorch if its package is
+    missing or its quantized model fails the parity check.
+
+    :param name: One of the keys of BACKENDS; defaults to RAG_CONFIG['EMBEDDING_BACKEND'].
+    :param model_name: Model name; defaults to RAG_CONFIG['EMBEDDING_MODEL'].
+    :return: A loaded EmbeddingBackend.
+    """
+    name = name or RAG_CONFIG['EMBEDDING_BACKEND']
+    model_name = model_name or RAG_CONFIG['EMBEDDING_MODEL']
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    try:
+        return BACKENDS[name](model_name)
+    except (ImportError, ParityError) as e:
+        if name == TorchEmbeddingBackend.backend_name:
+            raise
+        logger.warning(f"Embedding backend '{name}' unavailable ({e}); falling back to "
+                       f"'{TorchEmbeddingBackend.backend_name}'.")
+        return TorchEmbeddingBackend(model_name)
+
+def embedding_identity(model) -> Dict[str, str]:
+    """
+    Describe which model and backend produced a set of embeddings.
+
+    Vectors from different models (or from the same model run through different
+    backends) are not interchangeable, so indexes record this and reject mismatches.
+    """
+    return {
+        'model_name': getattr(model, 'model_name', type(model).__name__),
+        'backend': getattr(model, 'backend_name', type(model).__name__),
+        'dim': int(model.get_sentence_embedding_dimension()),
+    }
+
+# ===========================
+# Parity Check
+# ===========================
+
+def check_parity(reference, candidate, texts: List[str]) -> Dict[str, float]:
+    """
+    Compare two embedding models on the same texts.
+
+    :param reference: Model treated as ground truth (normally the PyTorch backend).
+    :param candidate: Model under test.
+    :param texts: Texts to embed with both.
+    :return: Minimum and mean cosine similarity between paired embeddings.
+    """
+    expected = np.asarray(reference.encode(texts), dtype=np.float32)
+    actual = np.asarray(candidate.encode(texts), dtype=np.float32)
+    cosines = np.sum(expected * actual, axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    )
+    return {'min_cosine': float(cosines.min()), 'mean_cosine': float(cosines.mean())}
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# This module provides the text embedding models used by RAGOptimizer and the response cache.
+# To modify:
+# - Set 'EMBEDDING_BACKEND' in RAG_CONFIG to 'onnx-int8' for faster CPU embedding; the model is
+#   exported to 'ONNX_DIR' on first use. Delete that directory to force a fresh export. If the export
+#   fails the parity check, parity_failed.json is left there and PyTorch is used instead.
+# - Changing 'EMBEDDING_MODEL' or 'EMBEDDING_BACKEND' makes the saved index unusable; it is rebuilt
+#   automatically on the next start.
+# - Check drift on your own text with: python -m benchmarks.embedding_parity
@@ -1,32 +1,43 @@
 #gui.py
 import tkinter as tk
 from tkinter import messagebox, filedialog
-from threading import Thread
+from threading import Thread, Event, Lock
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+import queue
 from voice_runllm import VoiceInterface
 from runllm import TheraxusAI
-import os
+from document_ingest import DocumentIngestor
+from config import GUI_CONFIG
 
 class TheraxusApp:
     def __init__(self, root, user_id="default_user"):
         self.root = root
         self.root.title("Theraxus - Advanced Text and Voice Interface")
         self.root.geometry("800x600")
-        
+
         # User-specific identifier
         self.user_id = user_id
 
         # Initialize TheraxusAI for text mode with user_id
         self.theraxus_text = TheraxusAI(user_id=self.user_id)
-        
-        # Initialize VoiceInterface for voice mode with user_id
-        self.voice_interface = VoiceInterface(user_id=self.user_id)
+
+        # Initialize VoiceInterface for voice mode, sharing the text mode's AI instance
+        self.voice_interface = VoiceInterface(user_id=self.user_id, ai=self.theraxus_text)
 
         # Track current mode and active threads
         self.current_mode = "Text"
         self.voice_thread = None
-        
+
+        # Backend work runs on the executor; widgets are only touched on the Tk main thread,
+        # which applies queued updates from ui_queue every UI_POLL_MS
+        self.executor = ThreadPoolExecutor(max_workers=GUI_CONFIG['WORKERS'], thread_name_prefix="theraxus-worker")
+        self.ui_queue = queue.Queue()
+        self.in_flight = {}  # Future -> cancel Event for turns not yet finished
+        self.in_flight_lock = Lock()
+
         # GUI Components
         self.create_widgets()
+        self.root.after(GUI_CONFIG['UI_POLL_MS'], self.drain_ui_queue)
 
     def create_widgets(self):
         # Mode switch button
@@ -37,8 +48,11 @@ class TheraxusApp:
         self.text_frame = tk.Frame(self.root)
         self.text_input = tk.Entry(self.text_frame, width=50)
         self.text_input.pack(side=tk.LEFT, padx=10)
+        self.text_input.bind("<Return>", lambda event: self.handle_text_input())
         self.send_button = tk.Button(self.text_frame, text="Send", command=self.handle_text_input)
         self.send_button.pack(side=tk.LEFT)
+        self.cancel_button = tk.Button(self.text_frame, text="Cancel", command=self.cancel_turns, state="disabled")
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
         self.text_frame.pack()
 
         self.response_area = tk.Text(self.root, wrap="word", width=90, height=20, state="disabled")
@@ -61,6 +75,56 @@ class TheraxusApp:
         self.view_docs_button.pack(side=tk.LEFT, padx=10)
         self.doc_frame.pack(pady=10)
 
+    # ===========================
+    # Thread-Safe UI Updates
+    # ===========================
+
+    def post(self, func, *args):
+        # Schedule func(*args) on the Tk main thread; safe to call from any thread
+        self.ui_queue.put((func, args))
+
+    def display_response(self, text):
+        # Queue a line for the response area; safe to call from any thread
+        self.ui_queue.put((None, (text,)))
+
+    def show_error(self, title, message):
+        # Show an error dialog from any thread
+        self.post(messagebox.showerror, title, message)
+
+    def drain_ui_queue(self):
+        # Apply queued UI updates on the main thread, merging consecutive lines into one insert
+        pending_lines = []
+        try:
+            for _ in range(GUI_CONFIG['MAX_UPDATES_PER_POLL']):
+                func, args = self.ui_queue.get_nowait()
+                if func is None:
+                    pending_lines.append(args[0])
+                    continue
+                self._insert_lines(pending_lines)
+                pending_lines = []
+                func(*args)
+        except queue.Empty:
+            pass
+        finally:
+            self._insert_lines(pending_lines)
+            self.root.after(GUI_CONFIG['UI_POLL_MS'], self.drain_ui_queue)
+
+    def _insert_lines(self, lines):
+        # Insert a batch of lines into the response area with a single widget update
+        if not lines:
+            return
+        self.response_area.config(state="normal")
+        self.response_area.insert(tk.END, "\n".join(lines) + "\n")
+        line_count = int(self.response_area.index("end-1c").split(".")[0])
+        if line_count > GUI_CONFIG['MAX_LINES']:
+            self.response_area.delete("1.0", f"{line_count - GUI_CONFIG['MAX_LINES']}.0")
+        self.response_area.config(state="disabled")
+        self.response_area.see(tk.END)
+
+    # ===========================
+    # Mode Switching
+    # ===========================
+
     def toggle_mode(self):
         # Toggle between Text and Voice modes
         if self.current_mode == "Text":
@@ -69,10 +133,8 @@ class TheraxusApp:
             self.switch_to_text_mode()
 
     def switch_to_text_mode(self):
-        # Switch to text mode, stopping any active voice sessions
-        if self.voice_thread and self.voice_thread.is_alive():
-            self.voice_interface.stop_event.set()  # Signal to stop the voice chat
-            self.voice_thread.join()  # Wait for the thread to finish
+        # Switch to text mode, signalling any active voice session to stop
+        self.voice_interface.stop_event.set()
 
         self.current_mode = "Text"
         self.mode_button.config(text="Switch to Voice Mode")
@@ -82,92 +144,143 @@ class TheraxusApp:
 
     def switch_to_voice_mode(self):
         # Switch to voice mode, ensuring any text operations are stopped
+        self.cancel_turns()
         self.current_mode = "Voice"
         self.mode_button.config(text="Switch to Text Mode")
         self.text_frame.pack_forget()
         self.voice_frame.pack()
         self.display_response("Switched to Voice Mode. Click 'Start Voice Chat' to begin.")
 
+    # ===========================
+    # Turns
+    # ===========================
+
     def handle_text_input(self):
-        # Handle text input from the user in text mode
+        # Handle text input from the user in text mode without blocking the main thread
         user_input = self.text_input.get().strip()
         if not user_input:
             return
-        self.display_response(f"You: {user_input}")
-        response = self.theraxus_text.generate_response(user_input)
-        self.display_response(f"Theraxus: {response}")
         self.text_input.delete(0, tk.END)
+        self.display_response(f"You: {user_input}")
+        self.submit_turn(user_input)
+
+    def submit_turn(self, user_input, cancel_event=None) -> Future:
+        # Queue a turn on the executor; the response is displayed when it completes
+        cancel_event = cancel_event or Event()
+        future = self.executor.submit(self.theraxus_text.generate_response, user_input, cancel_event)
+        with self.in_flight_lock:
+            self.in_flight[future] = cancel_event
+        self.post(self.cancel_button.config, {"state": "normal"})
+        future.add_done_callback(self._on_turn_done)
+        return future
+
+    def _on_turn_done(self, future):
+        # Runs on a worker thread when a turn finishes; hands the result to the UI queue
+        with self.in_flight_lock:
+            cancel_event = self.in_flight.pop(future, None)
+            idle = not self.in_flight
+        if idle:
+            self.post(self.cancel_button.config, {"state": "disabled"})
+
+        if future.cancelled() or (cancel_event is not None and cancel_event.is_set()):
+            self.display_response("Theraxus: (response cancelled)")
+        elif future.exception() is not None:
+            self.show_error("Response Error", f"Failed to generate a response: {future.exception()}")
+        else:
+            self.display_response(f"Theraxus: {future.result()}")
+
+    def cancel_turns(self):
+        # Cancel queued turns and signal running ones to abandon their result
+        with self.in_flight_lock:
+            turns = list(self.in_flight.items())
+        for future, cancel_event in turns:
+            cancel_event.set()
+            future.cancel()
+
+    # ===========================
+    # Voice Chat
+    # ===========================
 
     def start_voice_thread(self):
         # Start voice chat in a separate thread to avoid GUI freezing
+        if self.voice_thread and self.voice_thread.is_alive():
+            return
         self.voice_interface.stop_event.clear()  # Ensure the stop event is cleared
         self.voice_thread = Thread(target=self.start_voice_chat, daemon=True)
         self.voice_thread.start()
 
     def start_voice_chat(self):
-        # Start voice chat session in voice mode
+        # Runs the voice pipeline on the voice thread; its stages only reach the UI through the queue
         try:
-            self.display_response("Voice Chat Started. Speak after each response.")
-            while not self.voice_interface.stop_event.is_set():
-                # Transcribe user input
-                user_input, success = self.voice_interface.stt.process_audio()
-                if not success or not user_input.strip():
-                    continue
-                
-                # Display user’s transcribed input
-                self.display_response(f"You: {user_input}")
-                
-                # Generate AI response
-                ai_response = self.theraxus_text.generate_response(user_input)
-                
-                # Display AI response in GUI
-                self.display_response(f"Theraxus: {ai_response}")
-                
-                # Speak the response
-                self.voice_interface.tts.speak(ai_response)
-
+            self.display_response("Voice Chat Started. Speak at any time; talking over a response interrupts it.")
+            self.voice_interface.run_pipeline(
+                on_transcript=lambda user_input: self.display_response(f"You: {user_input}"),
+                generate=self.generate_voice_response,
+            )
         except Exception as e:
-            messagebox.showerror("Voice Chat Error", f"Failed to start voice chat: {e}")
+            self.show_error("Voice Chat Error", f"Failed to start voice chat: {e}")
+        finally:
+            self.display_response("Voice chat stopped.")
+
+    def generate_voice_response(self, user_input, cancel_event):
+        # Voice turns run on the shared executor too, so they never overlap text turns or document jobs
+        try:
+            return self.submit_turn(user_input, cancel_event).result()
+        except CancelledError:
+            return ""
 
     def stop_voice_chat(self):
-        # Stop the voice chat session
+        # Signal the voice session to stop; its pipeline threads wind down in the background
         self.voice_interface.stop_event.set()
-        if self.voice_thread and self.voice_thread.is_alive():
-            self.voice_thread.join()  # Ensure the thread is fully stopped
-        messagebox.showinfo("Voice Mode", "Voice chat stopped.")
+        self.cancel_turns()
+
+    # ===========================
+    # Document Management
+    # ===========================
 
     def upload_document(self):
-        # Upload a document and add to the system
-        file_path = filedialog.askopenfilename(title="Select a Document", filetypes=[("Text Files", "*.txt"), ("PDF Files", "*.pdf")])
-        if file_path:
+        # Upload documents and add them to the document store and search index
+        file_paths = filedialog.askopenfilenames(
+            title="Select Documents",
+            filetypes=[("Documents", "*.txt *.pdf *.md"), ("Text Files", "*.txt"), ("PDF Files", "*.pdf"), ("Markdown Files", "*.md")]
+        )
+        if not file_paths:
+            return
+        self.display_response(f"Uploading {len(file_paths)} document(s)...")
+
+        def run_upload():
             try:
-                # Placeholder for actual document processing logic
-                self.display_response(f"Document '{os.path.basename(file_path)}' uploaded successfully.")
-                # Add actual logic here to integrate with DatabaseManager with user_id
-                # Example: self.theraxus_text.db_manager.add_document(self.user_id, os.path.basename(file_path), content)
+                ingestor = DocumentIngestor(self.theraxus_text.db_manager, self.theraxus_text.rag, user_id=self.user_id)
+                counts = ingestor.ingest_files(
+                    file_paths,
+                    progress=lambda done, total: self.display_response(f"Processed {done}/{total} document(s)...")
+                )
+                self.display_response(
+                    f"Uploaded {counts['imported']} document(s) ({counts['duplicates']} near-duplicates), "
+                    f"{counts['skipped']} unchanged, {counts['failed']} failed."
+                )
             except Exception as e:
-                messagebox.showerror("Upload Error", f"Failed to upload document: {e}")
+                self.show_error("Upload Error", f"Failed to upload document: {e}")
+
+        self.executor.submit(run_upload)
 
     def view_documents(self):
-        # View available documents (placeholder logic)
-        try:
-            # Placeholder for document retrieval logic
-            documents = self.theraxus_text.db_manager.get_documents(self.user_id)  # Retrieve documents for the user
-            document_names = [doc for doc in documents.keys()]
-            self.display_response("Available Documents: " + ", ".join(document_names))
-        except Exception as e:
-            messagebox.showerror("View Documents Error", f"Failed to retrieve documents: {e}")
+        # List available documents without blocking the main thread
+        def run_view():
+            try:
+                # Names and metadata only, no contents; limited to this user's and shared documents
+                documents = self.theraxus_text.db_manager.list_documents(self.user_id)
+                document_names = [doc for doc in documents.keys()]
+                self.display_response("Available Documents: " + ", ".join(document_names))
+            except Exception as e:
+                self.show_error("View Documents Error", f"Failed to retrieve documents: {e}")
 
-    def display_response(self, text):
-        # Display response in the text area
-        self.response_area.config(state="normal")
-        self.response_area.insert(tk.END, text + "\n")
-        self.response_area.config(state="disabled")
-        self.response_area.see(tk.END)
+        self.executor.submit(run_view)
 
     def on_close(self):
-        # Cleanup and exit
+        # Cleanup and exit without waiting on in-flight work
         self.stop_voice_chat()  # Ensure voice chat is stopped if closing during voice mode
+        self.executor.shutdown(wait=False, cancel_futures=True)
         self.voice_interface.cleanup()  # Cleanup voice resources
         self.root.destroy()
 
@@ -0,0 +1,206 @@
+# label_filter.py
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from config import RAG_CONFIG
+from metrics import metrics
+import logging
+
+# ===========================
+# Logger Setup
+# ===========================
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# LabelMetadata Class
+# ===========================
+
+class LabelMetadata:
+    def __init__(self, path: Path):
+        """
+        Filterable metadata (owner, tags, date) for every label in the vector index.
+
+        Stored as JSON keyed by label, like the label-to-document map. For filtering,
+        the metadata is turned into NumPy columns indexed by label, so a filter becomes a
+        boolean bitset over labels computed with a few vectorized comparisons.
+
+        :param path: JSON file holding the metadata.
+        """
+        self.path = Path(path)
+        self.entries: Dict[int, Dict] = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                self.entries = {int(label): entry for label, entry in json.load(f).items()}
+        self._columns = None
+
+    def set(self, label: int, user: str, tags: Iterable[str] = (), mtime: Optional[float] = None):
+        """Record (or replace) the metadata of one label."""
+        self.entries[int(label)] = {'user': user, 'tags': sorted(set(tags)),
+                                    'mtime': time.time() if mtime is None else mtime}
+        self._columns = None
+
+    def remove(self, label: int):
+        """Forget a label that is no longer in the index."""
+        self.entries.pop(int(label), None)
+        self._columns = None
+
+    def clear(self):
+        self.entries = {}
+        self._columns = None
+
+    def save(self):
+        """Atomically persist the metadata."""
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    # ===========================
+    # Bitset Filters
+    # ===========================
+
+    def _build_columns(self) -> Dict:
+        """Lay the metadata out as arrays indexed by label."""
+        size = max(self.entries, default=-1) + 1
+        present = np.zeros(size, dtype=bool)
+        mtimes = np.zeros(size, dtype=np.float64)
+        user_codes = np.full(size, -1, dtype=np.int32)
+        users: Dict[str, int] = {}
+        tag_labels: Dict[str, List[int]] = {}
+        for label, entry in self.entries.items():
+            present[label] = True
+            mtimes[label] = entry['mtime']
+            user_codes[label] = users.setdefault(entry['user'], len(users))
+            for tag in entry['tags']:
+                tag_labels.setdefault(tag, []).append(label)
+        return {'present': present, 'mtimes': mtimes, 'user_codes': user_codes, 'users': users,
+                'tag_labels': {tag: np.array(labels) for tag, labels in tag_labels.items()}}
+
+    def mask(self, users: Optional[Iterable[str]] = None, tags: Optional[Iterable[str]] = None,
+             since: Optional[float] = None, until: Optional[float] = None) -> np.ndarray:
+        """
+        Compute the bitset of labels matching every given condition.
+
+        :param users: Owners to allow (e.g. [user_id, "global"]); None allows all.
+        :param tags: Labels carrying at least one of these tags; None allows all.
+        :param since: Earliest document time (UNIX seconds), inclusive.
+        :param until: Latest document time (UNIX seconds), inclusive.
+        :return: Boolean array where entry `label` is True if the label passes the filter.
+        """
+        if self._columns is None:
+            self._columns = self._build_columns()
+        columns = self._columns
+        mask = columns['present'].copy()
+        if users is not None:
+            codes = [columns['users'][user] for user in users if user in columns['users']]
+            mask &= np.isin(columns['user_codes'], codes)
+        if tags is not None:
+            tagged = np.zeros_like(mask)
+            for tag in tags:
+                tagged[columns['tag_labels'].get(tag, [])] = True
+            mask &= tagged
+        if since is not None:
+            mask &= columns['mtimes'] >= since
+        if until is not None:
+            mask &= columns['mtimes'] <= until
+        return mask
+
+# ===========================
+# Filtered k-NN Search
+# ===========================
+
+def exact_knn_query(vectors: np.ndarray, data: np.ndarray, labels: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Brute-force cosine k-NN over the given vectors.
+
+    :param vectors: (len(labels), dim) vectors of the candidate labels.
+    :param data: (num_queries, dim) query vectors.
+    :param labels: Label of each candidate row.
+    :param k: Number of results; at most len(labels).
+    :return: (labels, distances) arrays shaped (num_queries, k), nearest first.
+    """
+    vectors = np.array(vectors, dtype=np.float32)
+    vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    queries = np.asarray(data, dtype=np.float32)
+    queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+    distances = 1.0 - queries @ vectors.T
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(distances, top, axis=1).argsort(axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    return labels[top].astype(np.uint64), np.take_along_axis(distances, top, axis=1).astype(np.float32)
+
+def chunked_exact_knn_query(get_vectors: Callable[[np.ndarray], np.ndarray], data: np.ndarray,
+                            labels: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact k-NN over any number of labels, reading at most 'FILTER_EXACT_LIMIT' vectors at a time.
+
+    Each block's top-k is merged into a running top-k, so memory stays bounded however
+    many labels are allowed.
+    """
+    block_size = max(RAG_CONFIG['FILTER_EXACT_LIMIT'], k)
+    best_labels = best_distances = None
+    for start in range(0, len(labels), block_size):
+        block = labels[start:start + block_size]
+        block_labels, block_distances = exact_knn_query(get_vectors(block), data, block, min(k, len(block)))
+        if best_labels is not None:
+            block_labels = np.concatenate([best_labels, block_labels], axis=1)
+            block_distances = np.concatenate([best_distances, block_distances], axis=1)
+        order = np.argsort(block_distances, axis=1, kind='stable')[:, :k]
+        best_labels = np.take_along_axis(block_labels, order, axis=1)
+        best_distances = np.take_along_axis(block_distances, order, axis=1)
+    return best_labels, best_distances
+
+def filtered_knn_query(index, data: np.ndarray, k: int, mask: np.ndarray,
+                       get_vectors: Optional[Callable[[np.ndarray], np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    k-NN over the labels allowed by a bitset.
+
+    Selective filters (at most RAG_CONFIG['FILTER_EXACT_LIMIT'] allowed labels) are
+    searched exactly with NumPy, which is both correct and cheap at that size. Broader
+    filters are pushed into hnswlib's filter callback, with `ef` raised to k / selectivity
+    so the graph walk visits enough allowed labels; if it still cannot collect k of them,
+    an exact search in bounded blocks is used instead.
+
+    :param index: An hnswlib.Index in cosine space.
+    :param data: (num_queries, dim) query vectors.
+    :param k: Number of results; must not exceed the number of allowed labels.
+    :param mask: Boolean array indexed by label.
+    :param get_vectors: Optional fast lookup of the vectors for an array of labels (e.g. a
+                        memory-mapped copy); defaults to reading them back from the index.
+    :return: (labels, distances) arrays shaped (num_queries, k), nearest first.
+    """
+    allowed = np.flatnonzero(mask)
+    get_vectors = get_vectors or (lambda labels: index.get_items(labels.tolist()))
+    if len(allowed) <= RAG_CONFIG['FILTER_EXACT_LIMIT']:
+        metrics.increment('rag_filtered_searches', method='exact')
+        return exact_knn_query(get_vectors(allowed), data, allowed, k)
+    limit = len(mask)
+    count = index.get_current_count()
+    base_ef = index.ef
+    # Only a fraction of the visited labels pass the filter, so widen the candidate list to match
+    index.set_ef(max(base_ef, min(count, int(np.ceil(k * count / len(allowed))))))
+    try:
+        result = index.knn_query(data, k=k, filter=lambda label: label < limit and bool(mask[label]))
+        metrics.increment('rag_filtered_searches', method='hnsw')
+        return result
+    except RuntimeError:
+        metrics.increment('rag_filtered_searches', method='hnsw_fallback')
+        return chunked_exact_knn_query(get_vectors, data, allowed, k)
+    finally:
+        index.set_ef(base_ef)
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# This module restricts vector search to documents matching metadata conditions.
+# To modify:
+# - Add a condition by storing the field in `LabelMetadata.set`, adding a column in `_build_columns`
+#   and combining it into the bitset in `mask`.
+# - Tune 'FILTER_EXACT_LIMIT' in RAG_CONFIG: below it filtered searches scan the allowed vectors
+#   exactly; above it they walk the HNSW graph with the filter applied.
@@ -0,0 +1,359 @@
+# metrics.py
+
+import atexit
+import bisect
+import cProfile
+import functools
+import inspect
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from config import METRICS_CONFIG
+import logging
+
+# ===========================
+# Logger Setup
+# ===========================
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Histogram Class
+# ===========================
+
+class Histogram:
+    def __init__(self, buckets: List[float], reservoir_size: int):
+        """Cumulative latency histogram with a reservoir of recent samples for percentiles."""
+        self.buckets = sorted(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=reservoir_size)
+
+    def observe(self, value: float):
+        """Record a single observation in seconds."""
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def percentile(self, q: float) -> float:
+        """Return the q-th percentile (0-100) of the recent samples."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> Dict:
+        """Summarize the histogram as plain values for JSON export."""
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+# ===========================
+# MetricsRegistry Class
+# ===========================
+
+class MetricsRegistry:
+    def __init__(self):
+        """Initialize the in-process registry of latency histograms, counters and gauges."""
+        self.enabled = METRICS_CONFIG['ENABLED']
+        self.lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.gauges: Dict[Tuple[str, Tuple], float] = {}
+        self.recent_spans = deque(maxlen=METRICS_CONFIG['RECENT_SPANS'])
+        self.local = threading.local()
+        self.last_export = 0.0
+        self.profile_armed = METRICS_CONFIG['PROFILE_NEXT_TURN']
+        if self.enabled:
+            atexit.register(self.export)
+
+    # ===========================
+    # Recording
+    # ===========================
+
+    def observe(self, stage: str, seconds: float, user_id: str = "global"):
+        """
+        Record a latency observation for a stage.
+
+        :param stage: Name of the pipeline stage, e.g. 'rag.search'.
+        :param seconds: Duration of the stage in seconds.
+        :param user_id: The user the work was done for.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            key = (stage, user_id)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(METRICS_CONFIG['LATENCY_BUCKETS'], METRICS_CONFIG['RESERVOIR_SIZE'])
+                self.histograms[key] = histogram
+            histogram.observe(seconds)
+
+    def increment(self, name: str, value: float = 1, **labels):
+        """
+        Increase a counter, e.g. increment('cache_hits', cache='rag_index').
+
+        :param name: Counter name.
+        :param value: Amount to add.
+        :param labels: Label values distinguishing series of the same counter.
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """
+        Set a gauge to its current value, e.g. set_gauge('rag_index_size', 1200).
+
+        :param name: Gauge name.
+        :param value: Current value.
+        :param labels: Label values distinguishing series of the same gauge.
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    @contextmanager
+    def span(self, stage: str, user_id: str = "global"):
+        """
+        Time the enclosed block as one span of `stage`.
+
+        Spans opened inside another span on the same thread record it as their parent.
+        """
+        if not self.enabled:
+            yield
+            return
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        parent = stack[-1] if stack else None
+        stack.append(stage)
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            self.observe(stage, duration, user_id)
+            with self.lock:
+                self.recent_spans.append({
+                    'stage': stage,
+                    'user': user_id,
+                    'parent': parent,
+                    'start': started_at,
+                    'duration': duration,
+                    'thread': threading.current_thread().name,
+                })
+
+    # ===========================
+    # Export
+    # ===========================
+
+    def to_dict(self) -> Dict:
+        """Snapshot every metric as a JSON-serializable dictionary."""
+        with self.lock:
+            return {
+                'generated_at': time.time(),
+                'stages': [
+                    {'stage': stage, 'user': user_id, **histogram.summary()}
+                    for (stage, user_id), histogram in sorted(self.histograms.items())
+                ],
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                'gauges': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self.gauges.items())
+                ],
+                'recent_spans': list(self.recent_spans),
+            }
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            if self.histograms:
+                lines.append('# HELP theraxus_stage_latency_seconds Latency of each pipeline stage.')
+                lines.append('# TYPE theraxus_stage_latency_seconds histogram')
+            for (stage, user_id), histogram in sorted(self.histograms.items()):
+                base = f'stage="{_escape(stage)}",user="{_escape(user_id)}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f'theraxus_stage_latency_seconds_bucket{{{base},le="{bound}"}} {cumulative}')
+                lines.append(f'theraxus_stage_latency_seconds_bucket{{{base},le="+Inf"}} {histogram.count}')
+                lines.append(f'theraxus_stage_latency_seconds_sum{{{base}}} {histogram.total}')
+                lines.append(f'theraxus_stage_latency_seconds_count{{{base}}} {histogram.count}')
+
+            for metric_type, series, suffix in (('counter', self.counters, '_total'), ('gauge', self.gauges, '')):
+                declared = set()
+                for (name, labels), value in sorted(series.items()):
+                    metric = f'theraxus_{name}{suffix}'
+                    if metric not in declared:
+                        lines.append(f'# TYPE {metric} {metric_type}')
+                        declared.add(metric)
+                    label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels)
+                    lines.append(f'{metric}{{{label_text}}} {value}' if label_text else f'{metric} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: Optional[Path] = None):
+        """
+        Write the metrics files configured in METRICS_CONFIG.
+
+        :param path: Base path without extension; defaults to 'EXPORT_PATH'.
+        """
+        if not self.enabled:
+            return
+        base = Path(path or METRICS_CONFIG['EXPORT_PATH'])
+        try:
+            base.parent.mkdir(parents=True, exist_ok=True)
+            formats = METRICS_CONFIG['EXPORT_FORMATS']
+            if 'prometheus' in formats:
+                _atomic_write(base.with_suffix('.prom'), self.to_prometheus())
+            if 'json' in formats:
+                _atomic_write(base.with_suffix('.json'), json.dumps(self.to_dict(), indent=4))
+            self.last_export = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error exporting metrics: {e}")
+
+    def maybe_export(self):
+        """Export the metrics files if 'EXPORT_INTERVAL' has elapsed since the last write."""
+        if self.enabled and time.monotonic() - self.last_export >= METRICS_CONFIG['EXPORT_INTERVAL']:
+            self.export()
+
+    # ===========================
+    # Single-Turn Profiling
+    # ===========================
+
+    def request_profile(self):
+        """Arm the profiler so the next turn is captured with cProfile and tracemalloc."""
+        self.profile_armed = True
+
+    @contextmanager
+    def profile_turn(self, user_id: str = "global"):
+        """
+        Profile the enclosed turn if a profile was requested, then disarm.
+
+        Writes '<timestamp>_<user>.prof' (cProfile stats) and '<timestamp>_<user>.txt'
+        (top functions and allocations) to 'PROFILE_DIR'.
+        """
+        with self.lock:
+            armed = self.profile_armed
+            self.profile_armed = False
+        if not armed:
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+            self._write_profile(profiler, snapshot, user_id)
+
+    def _write_profile(self, profiler: cProfile.Profile, snapshot, user_id: str):
+        """Dump one captured turn profile to disk."""
+        try:
+            profile_dir = Path(METRICS_CONFIG['PROFILE_DIR'])
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            stem = profile_dir / f"{time.strftime('%Y%m%d-%H%M%S')}_{user_id}"
+            profiler.dump_stats(str(stem.with_suffix('.prof')))
+
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(30)
+            report.write("\nTop memory allocations:\n")
+            for stat in snapshot.statistics('lineno')[:20]:
+                report.write(f"{stat}\n")
+            _atomic_write(stem.with_suffix('.txt'), report.getvalue())
+            logger.info(f"Turn profile written to {stem}.prof")
+        except Exception as e:
+            logger.error(f"Error writing turn profile: {e}")
+
+# ===========================
+# Helper Functions
+# ===========================
+
+def _escape(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _atomic_write(path: Path, text: str):
+    """Write text through a temporary file so readers never see a partial file."""
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+# ===========================
+# Module-Level Registry
+# ===========================
+
+metrics = MetricsRegistry()
+
+def timed(stage: str):
+    """
+    Decorator recording each call as a span of `stage`.
+
+    The user is taken from a `user_id` argument if the function has one, otherwise
+    from `self.user_id`, otherwise "global".
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        has_user_param = 'user_id' in signature.parameters
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            user_id = None
+            if has_user_param:
+                bound = signature.bind_partial(*args, **kwargs)
+                user_id = bound.arguments.get('user_id', signature.parameters['user_id'].default)
+            if user_id is None or user_id is inspect.Parameter.empty:
+                user_id = getattr(args[0], 'user_id', None) if args else None
+            with metrics.span(stage, str(user_id or "global")):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# This module records where each turn's time goes without any external dependency.
+# To modify:
+# - Instrument a new stage with `@timed('stage.name')` or `with metrics.span('stage.name', user_id):`.
+# - Record cache hits/misses with `metrics.increment('cache_hits', cache='name')` and sizes with
+#   `metrics.set_gauge(...)`.
+# - Call `metrics.request_profile()` (or set 'PROFILE_NEXT_TURN') to profile the next turn.
+# - Point Prometheus' node-exporter textfile collector at the '.prom' file to scrape it.
@@ -1,11 +1,15 @@
 # rag_optimizer.py
 
 import hnswlib
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
+from pathlib import Path
 import numpy as np
 from config import CACHE_DIR, RAG_CONFIG
 from database_manager import DatabaseManager
+from embedding_backends import create_embedding_model, embedding_identity
+from label_filter import LabelMetadata, filtered_knn_query
+from vector_store import VectorStore
+from metrics import metrics, timed
 import json
 import logging
 
@@ -20,86 +24,365 @@ logger = logging.getLogger(__name__)
 # ===========================
 
 class RAGOptimizer:
-    def __init__(self):
-        """Initialize the RAG Optimizer with embedding model and vector index."""
-        self.db_manager = DatabaseManager()
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')  # You can change the model as needed
-        self.dim = self.embedding_model.get_sentence_embedding_dimension()
-        self.index = hnswlib.Index(space='cosine', dim=self.dim)
-        self.index_file = CACHE_DIR / 'hnsw_index.bin'
+    def __init__(self, db_manager: Optional[DatabaseManager] = None, embedding_model=None, cache_dir: Optional[Path] = None):
+        """
+        Initialize the RAG Optimizer with embedding model and vector index.
+        
+        :param db_manager: Optional DatabaseManager to read documents from; a default one is created if omitted.
+        :param embedding_model: Optional object with SentenceTransformer's `encode` and
+                                `get_sentence_embedding_dimension` methods (e.g. a benchmark stub).
+                                Defaults to the backend and model set in RAG_CONFIG.
+        :param cache_dir: Optional directory for the index files. Defaults to CACHE_DIR.
+        """
+        self.db_manager = db_manager or DatabaseManager()
+        self.embedding_model = embedding_model or create_embedding_model()
+        self.embedding_id = embedding_identity(self.embedding_model)
+        self.dim = self.embedding_id['dim']
+        self.cache_dir = Path(cache_dir) if cache_dir else CACHE_DIR
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if RAG_CONFIG['NUM_SHARDS'] > 0:
+            # Shard processes only receive vectors; the embedding model stays in this process
+            from sharded_retrieval import ShardedIndex
+            shard_dir = self.cache_dir / 'shards'
+            self.index = ShardedIndex(space='cosine', dim=self.dim, num_shards=RAG_CONFIG['NUM_SHARDS'], shard_dir=shard_dir)
+            self.index_file = shard_dir / 'manifest.json'
+        else:
+            self.index = hnswlib.Index(space='cosine', dim=self.dim)
+            self.index_file = self.cache_dir / 'hnsw_index.bin'
+        self.id_map_file = self.cache_dir / 'id_to_doc.json'
+        self.manifest_file = self.cache_dir / 'index_manifest.json'
         self.id_to_doc = {}
+        self.label_metadata = LabelMetadata(self.cache_dir / 'label_metadata.json')
+        # Memory-mapped copy of the document vectors, scanned by selective filtered searches
+        self.embedding_store = VectorStore(self.cache_dir / 'embeddings')
+        self._embedding_rows = None
+        self._unsaved = False  # Set when index_documents(..., save=False) changed the index since the last save
+        self.change_listeners: List[Callable[[Optional[List[str]]], None]] = []
         
-        if self.index_file.exists():
-            # Load existing index and ID mappings
-            self.index.load_index(str(self.index_file))
-            with open(CACHE_DIR / 'id_to_doc.json', 'r') as f:
-                self.id_to_doc = json.load(f)
+        if self.index_file.exists() and self._load_index():
+            if not self.label_metadata.path.exists():
+                # Indexes saved before label metadata existed get it from the document store
+                self._record_metadata({doc: int(label) for label, doc in self.id_to_doc.items()},
+                                      self.db_manager.list_documents())
+                self.label_metadata.save()
+            metrics.increment('cache_hits', cache='rag_index')
+            metrics.set_gauge('rag_index_size', self.index.get_current_count())
             logger.info("Loaded existing HNSW index and ID mappings.")
         else:
             # Initialize a new HNSW index
+            self.label_metadata.clear()
+            self._reset_embedding_store()
             self.index.init_index(max_elements=10000, ef_construction=200, M=16)
             self.index.set_ef(RAG_CONFIG['TOP_K'])
+            metrics.increment('cache_misses', cache='rag_index')
             logger.info("Initialized new HNSW index.")
             # Build index with a placeholder for multi-user support
             self.build_index()
 
+    def _load_index(self) -> bool:
+        """Load the saved index and ID mappings; return False if they do not fit the current settings."""
+        try:
+            self._check_manifest()
+            self.index.load_index(str(self.index_file))
+            with open(self.id_map_file, 'r') as f:
+                self.id_to_doc = json.load(f)
+            return True
+        except ValueError as e:
+            logger.warning(f"Saved index cannot be used, rebuilding: {e}")
+            return False
+
+    def _check_manifest(self):
+        """
+        Reject a saved index built with a different embedding model or backend.
+
+        Indexes saved before the manifest existed were built with the default PyTorch model.
+
+        :raises ValueError: If the recorded model, backend or dimension differs from the current one.
+        """
+        if self.manifest_file.exists():
+            with open(self.manifest_file, 'r') as f:
+                recorded = json.load(f)['embedding']
+        else:
+            recorded = {'model_name': 'all-MiniLM-L6-v2', 'backend': 'torch', 'dim': 384}
+        if recorded != self.embedding_id:
+            raise ValueError(f"index was built with {recorded}, but the current embedding model is {self.embedding_id}")
+
     # ===========================
     # Build Index for Multi-User (Placeholder)
     # ===========================
     
+    @timed('rag.build_index')
     def build_index(self, user_id: str = "global"):
         """
         Build the vector index from uploaded documents for a specific user.
         
         :param user_id: Unique identifier for the user. Default is "global" for shared access.
         """
-        documents = self.db_manager.get_documents(user_id)
-        doc_names = list(documents.keys())
+        stored = self.db_manager.list_documents()
+        doc_names = list(stored.keys())
         if not doc_names:
             logger.warning(f"No documents found to build the index for user {user_id}.")
             return
         
-        # Generate embeddings for all documents
-        embeddings = self.embedding_model.encode([documents[doc]['content'] for doc in doc_names])
+        # Stream contents in chunks so only one chunk of the corpus is in memory at a time
+        self._ensure_capacity(len(doc_names))
+        self.id_to_doc = {}
+        self.label_metadata.clear()
+        self._reset_embedding_store()
+        chunk_size = RAG_CONFIG['BUILD_CHUNK_SIZE']
+        names, texts = [], []
+        for doc_name, content in self.db_manager.iter_documents(doc_names):
+            names.append(doc_name)
+            texts.append(content)
+            if len(names) >= chunk_size:
+                self._add_chunk(names, texts, stored)
+                names, texts = [], []
+        if names:
+            self._add_chunk(names, texts, stored)
+        
+        # Save the index and ID mappings for future use
+        self._save_index()
+        self._notify_change(None)
+        logger.info(f"HNSW index built and saved for user {user_id}.")
+
+    def _add_chunk(self, doc_names: List[str], texts: List[str], stored: Dict[str, Dict]):
+        """Embed one chunk of a full rebuild and add it under the next sequential labels."""
+        embeddings = self.embedding_model.encode(texts, batch_size=RAG_CONFIG['EMBED_BATCH_SIZE'])
         embeddings = np.array(embeddings).astype('float32')
+        first_label = len(self.id_to_doc)
+        labels = range(first_label, first_label + len(doc_names))
+        self.index.add_items(embeddings, labels)
+        self._store_embeddings(labels, embeddings)
+        for label, doc_name in zip(labels, doc_names):
+            self.id_to_doc[str(label)] = doc_name
+        self._record_metadata(dict(zip(doc_names, labels)), stored)
+
+    # ===========================
+    # Incremental Indexing
+    # ===========================
+
+    @timed('rag.index_documents')
+    def index_documents(self, documents: Dict[str, str], user_id: str = "global", save: bool = True):
+        """
+        Embed a batch of documents and add them to the existing index.
         
-        # Add embeddings to the HNSW index
-        self.index.add_items(embeddings, range(len(doc_names)))
-        self.id_to_doc = {str(idx): doc for idx, doc in enumerate(doc_names)}
+        Documents whose name is already indexed keep their label and have their
+        vector replaced, so re-importing a file does not create duplicates.
         
-        # Save the index and ID mappings for future use
+        :param documents: Mapping of document name to document content.
+        :param user_id: Unique identifier for the user. Default is "global" for shared access.
+        :param save: Write the index files after this batch. Bulk imports pass False and call
+                     `flush` at checkpoints instead, as each save rewrites the whole index.
+        """
+        if not documents:
+            return
+        doc_to_id = {doc: int(idx) for idx, doc in self.id_to_doc.items()}
+        next_label = max(doc_to_id.values(), default=-1) + 1
+
+        doc_names = list(documents.keys())
+        labels = []
+        for doc in doc_names:
+            if doc not in doc_to_id:
+                doc_to_id[doc] = next_label
+                next_label += 1
+            labels.append(doc_to_id[doc])
+
+        embeddings = self.embedding_model.encode(
+            [documents[doc] for doc in doc_names],
+            batch_size=RAG_CONFIG['EMBED_BATCH_SIZE']
+        )
+        embeddings = np.array(embeddings).astype('float32')
+
+        self._ensure_capacity(next_label)
+        self.index.add_items(embeddings, labels)
+        self._store_embeddings(labels, embeddings)
+        for doc, label in zip(doc_names, labels):
+            self.id_to_doc[str(label)] = doc
+        self._record_metadata(dict(zip(doc_names, labels)), self.db_manager.get_metadata(doc_names), user_id)
+
+        if save:
+            self._save_index()
+        else:
+            self._unsaved = True
+        self._notify_change(doc_names)
+        logger.info(f"Indexed {len(doc_names)} documents for user {user_id}.")
+
+    @timed('rag.rebuild_shard')
+    def rebuild_shard(self, shard_id: int):
+        """
+        Re-embed the documents of one retrieval shard while the other shards keep serving.
+        
+        :param shard_id: Shard number, from 0 to RAG_CONFIG['NUM_SHARDS'] - 1.
+        :raises RuntimeError: If sharded retrieval is not enabled.
+        """
+        if not hasattr(self.index, 'rebuild_shard'):
+            raise RuntimeError("Sharded retrieval is disabled; set 'NUM_SHARDS' in RAG_CONFIG.")
+        owned = {
+            doc: int(label) for label, doc in self.id_to_doc.items()
+            if int(label) % self.index.num_shards == shard_id
+        }
+        names, texts = [], []
+        for doc_name, content in self.db_manager.iter_documents(list(owned)):
+            names.append(doc_name)
+            texts.append(content)
+        embeddings = self.embedding_model.encode(texts, batch_size=RAG_CONFIG['EMBED_BATCH_SIZE']) if texts else []
+        embeddings = np.array(embeddings, dtype='float32').reshape(-1, self.dim)
+        self.index.rebuild_shard(shard_id, embeddings, [owned[name] for name in names])
+        self._store_embeddings([owned[name] for name in names], embeddings)
+
+        # Labels whose document no longer exists were dropped from the shard
+        for doc, label in owned.items():
+            if doc not in names:
+                del self.id_to_doc[str(label)]
+                self.label_metadata.remove(label)
+        self._record_metadata({name: owned[name] for name in names}, self.db_manager.get_metadata(names))
+        self._save_index()
+        self._notify_change(list(owned))
+
+    def _record_metadata(self, labels: Dict[str, int], stored: Dict[str, Dict], user_id: str = "global"):
+        """
+        Copy owner, tags and date of indexed documents into the label metadata.
+        
+        :param labels: Mapping of document name to its label.
+        :param stored: Document store metadata covering (at least) these documents.
+        :param user_id: Owner assumed for documents missing from the store.
+        """
+        for doc_name, label in labels.items():
+            meta = stored.get(doc_name, {})
+            self.label_metadata.set(label, meta.get('user', user_id), meta.get('tags', []), meta.get('mtime'))
+
+    def _reset_embedding_store(self):
+        self.embedding_store.write_matrix([], np.empty((0, 0)))
+        self._embedding_rows = None
+
+    def _store_embeddings(self, labels, embeddings: np.ndarray):
+        """Append (or overwrite) the vectors of these labels in the memory-mapped copy."""
+        self.embedding_store.append({str(label): vector for label, vector in zip(labels, embeddings)})
+        self._embedding_rows = None
+
+    def _stored_vectors(self, labels: np.ndarray) -> np.ndarray:
+        """Gather vectors for labels from the memory-mapped copy, or from the index if it lacks any."""
+        if self._embedding_rows is None:
+            ids, self._embedding_matrix = self.embedding_store.load()
+            self._embedding_rows = {int(label): row for row, label in enumerate(ids)}
+        rows = [self._embedding_rows.get(int(label)) for label in labels]
+        if None in rows:
+            return self.index.get_items(labels.tolist())
+        return self._embedding_matrix[rows]
+
+    def _ensure_capacity(self, required: int):
+        """Grow the HNSW index so it can hold at least `required` elements."""
+        max_elements = self.index.get_max_elements()
+        if required > max_elements:
+            self.index.resize_index(max(required, max_elements * 2))
+
+    def add_change_listener(self, listener: Callable[[Optional[List[str]]], None]):
+        """
+        Register a callback run after indexed documents change.
+        
+        :param listener: Called with the changed document names, or None after a full rebuild.
+        """
+        self.change_listeners.append(listener)
+
+    def _notify_change(self, doc_names: Optional[List[str]]):
+        """Tell every registered listener which documents changed."""
+        for listener in self.change_listeners:
+            try:
+                listener(doc_names)
+            except Exception as e:
+                logger.error(f"Index change listener failed: {e}")
+
+    def flush(self):
+        """Persist batches indexed with `save=False`, if there are any."""
+        if self._unsaved:
+            self._save_index()
+
+    def _save_index(self):
+        """Persist the HNSW index and ID mappings to the cache directory."""
         self.index.save_index(str(self.index_file))
-        with open(CACHE_DIR / 'id_to_doc.json', 'w') as f:
+        with open(self.id_map_file, 'w') as f:
             json.dump(self.id_to_doc, f, indent=4)
-        logger.info(f"HNSW index built and saved for user {user_id}.")
+        self.label_metadata.save()
+        with open(self.manifest_file, 'w') as f:
+            json.dump({'embedding': self.embedding_id, 'count': self.index.get_current_count()}, f, indent=4)
+        metrics.set_gauge('rag_index_size', self.index.get_current_count())
+        self._unsaved = False
 
     # ===========================
     # Search Documents for Multi-User (Placeholder)
     # ===========================
     
-    def search_documents(self, query: str, user_id: str = "global") -> List[str]:
+    @timed('rag.search')
+    def search_documents(self, query: str, user_id: str = "global", users: Optional[List[str]] = None,
+                         tags: Optional[List[str]] = None, since: Optional[float] = None,
+                         until: Optional[float] = None) -> List[str]:
         """
         Search for top K relevant documents based on the query for a specific user.
         
         :param query: The query string.
         :param user_id: Unique identifier for the user. Default is "global" for shared access.
+        :param users, tags, since, until: Optional filters, see `search_by_embedding`.
         :return: List of relevant document names.
         """
         try:
             # Generate embedding for the query
-            query_embedding = self.embedding_model.encode([query]).astype('float32')
-            
-            # Perform KNN search
-            labels, distances = self.index.knn_query(query_embedding, k=RAG_CONFIG['TOP_K'])
-            
-            # Retrieve document names based on labels
-            top_docs = [self.id_to_doc[str(label)] for label in labels[0]]
+            query_embedding = self.embed_query(query)
+            top_docs = self.search_by_embedding(query_embedding, user_id=user_id, users=users, tags=tags,
+                                                since=since, until=until)
             logger.info(f"Retrieved top {RAG_CONFIG['TOP_K']} documents for user {user_id} and query: {query}")
             return top_docs
         except Exception as e:
             logger.error(f"Error searching documents for user {user_id}: {e}")
             return []
 
+    @timed('rag.embed_query')
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed a query string, so callers can reuse one embedding for retrieval and caching.
+        
+        :param query: The query string.
+        :return: A (1, dim) float32 array.
+        """
+        return np.asarray(self.embedding_model.encode([query]), dtype='float32')
+
+    @timed('rag.search_by_embedding')
+    def search_by_embedding(self, query_embedding: np.ndarray, user_id: str = "global",
+                            users: Optional[List[str]] = None, tags: Optional[List[str]] = None,
+                            since: Optional[float] = None, until: Optional[float] = None) -> List[str]:
+        """
+        Search for top K relevant documents for an already-embedded query.
+        
+        Filters are applied inside the search rather than to its results, so a filter
+        matching few documents still returns up to TOP_K of them.
+        
+        :param query_embedding: A (1, dim) float32 query vector.
+        :param user_id: Unique identifier for the user. Default is "global" for shared access.
+        :param users: Only documents owned by these users (e.g. [user_id, "global"]).
+        :param tags: Only documents carrying at least one of these tags.
+        :param since: Only documents added at or after this UNIX time.
+        :param until: Only documents added at or before this UNIX time.
+        :return: List of relevant document names.
+        """
+        if users is None and tags is None and since is None and until is None:
+            # Perform KNN search (hnswlib rejects k larger than the number of indexed items)
+            k = min(RAG_CONFIG['TOP_K'], self.index.get_current_count())
+            if k == 0:
+                return []
+            labels, distances = self.index.knn_query(query_embedding, k=k)
+        else:
+            mask = self.label_metadata.mask(users=users, tags=tags, since=since, until=until)
+            k = min(RAG_CONFIG['TOP_K'], int(mask.sum()))
+            if k == 0:
+                return []
+            if isinstance(self.index, hnswlib.Index):
+                labels, distances = filtered_knn_query(self.index, query_embedding, k, mask,
+                                                       get_vectors=self._stored_vectors)
+            else:
+                labels, distances = self.index.knn_query(query_embedding, k=k, filter=mask)
+        
+        # Retrieve document names based on labels
+        return [self.id_to_doc[str(label)] for label in labels[0]]
+
     # ===========================
     # Update Index for New Documents (Multi-User Placeholder)
     # ===========================
@@ -123,8 +406,12 @@ class RAGOptimizer:
     # - Introduced placeholders for multi-user support in indexing and searching.
     # - Improved logging for clarity in user-specific document processing.
     # - Methods can be extended to handle incremental updates for new documents.
+    # - Added `index_documents` so bulk imports can append batches without rebuilding the index.
 
     # To extend functionality:
-    # - Change the embedding model by initializing SentenceTransformer with a different model name.
+    # - Change the embedding model or backend with 'EMBEDDING_MODEL' and 'EMBEDDING_BACKEND' in RAG_CONFIG.
     # - Implement an incremental index update method (`update_index_for_user`) for improved efficiency.
     # - Adjust HNSW index parameters (`ef_construction`, `M`) in the `__init__` method as needed.
+    # - Restrict searches by owner, tag or date with the `users`, `tags`, `since` and `until` arguments;
+    #   the metadata behind them is copied from the document store into label_metadata.json.
+    # - Set 'NUM_SHARDS' in RAG_CONFIG to spread the index over worker processes (see sharded_retrieval.py).
@@ -0,0 +1,240 @@
+# response_cache.py
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+import hnswlib
+import numpy as np
+from config import RESPONSE_CACHE_CONFIG
+from metrics import metrics
+import logging
+
+# ===========================
+# Logger Setup
+# ===========================
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# SemanticResponseCache Class
+# ===========================
+
+class SemanticResponseCache:
+    def __init__(self, rag):
+        """
+        Initialize a cache of responses keyed by query embedding and retrieved context.
+
+        A cached response is reused when a new query's embedding is within
+        'SIMILARITY_THRESHOLD' cosine similarity of a cached query in the same scope and
+        retrieval returned the same set of documents. Entries that reference changed
+        documents are dropped through the RAG optimizer's change notifications.
+
+        :param rag: The RAGOptimizer whose embeddings and documents the cache follows.
+        """
+        self.dim = rag.dim
+        self.source_file = rag.index_file
+        self.cache_dir = rag.cache_dir / RESPONSE_CACHE_CONFIG['CACHE_SUBDIR']
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.cache_dir / 'index.bin'
+        self.entries_file = self.cache_dir / 'entries.json'
+
+        self.lock = threading.Lock()
+        self.entries: Dict[int, Dict] = {}
+        self.scope_counts = Counter()
+        self.next_label = 0
+        self.unsaved = 0
+        self._load()
+
+        rag.add_change_listener(self.invalidate_documents)
+        atexit.register(self.save)
+
+    # ===========================
+    # Persistence
+    # ===========================
+
+    def _new_index(self) -> hnswlib.Index:
+        """Create an empty ANN index sized for 'MAX_ENTRIES'."""
+        index = hnswlib.Index(space='cosine', dim=self.dim)
+        index.init_index(max_elements=RESPONSE_CACHE_CONFIG['MAX_ENTRIES'], ef_construction=100, M=16,
+                         allow_replace_deleted=True)
+        index.set_ef(max(50, RESPONSE_CACHE_CONFIG['CANDIDATES']))
+        return index
+
+    def _source_stamp(self) -> Optional[float]:
+        """Modification time of the document index, used to detect changes made by other processes."""
+        return self.source_file.stat().st_mtime if self.source_file.exists() else None
+
+    def _load(self):
+        """Load the persisted cache, discarding it if the documents were re-indexed since it was saved."""
+        if not (self.index_file.exists() and self.entries_file.exists()):
+            self.index = self._new_index()
+            return
+        try:
+            with open(self.entries_file, 'r') as f:
+                saved = json.load(f)
+            if saved['source_stamp'] != self._source_stamp():
+                logger.info("Documents changed since the response cache was saved; starting with an empty cache.")
+                self.index = self._new_index()
+                return
+            self.index = hnswlib.Index(space='cosine', dim=self.dim)
+            self.index.load_index(str(self.index_file), max_elements=RESPONSE_CACHE_CONFIG['MAX_ENTRIES'],
+                                  allow_replace_deleted=True)
+            self.index.set_ef(max(50, RESPONSE_CACHE_CONFIG['CANDIDATES']))
+            self.entries = {int(label): entry for label, entry in saved['entries'].items()}
+            self.scope_counts = Counter(entry['scope'] for entry in self.entries.values())
+            self.next_label = saved['next_label']
+            metrics.set_gauge('response_cache_size', len(self.entries))
+            logger.info(f"Loaded response cache with {len(self.entries)} entries.")
+        except Exception as e:
+            logger.error(f"Error loading response cache, starting empty: {e}")
+            self.index = self._new_index()
+            self.entries, self.scope_counts, self.next_label = {}, Counter(), 0
+
+    def save(self):
+        """Persist the cache index and entries atomically."""
+        with self.lock:
+            try:
+                tmp_index = self.index_file.with_suffix('.tmp')
+                self.index.save_index(str(tmp_index))
+                os.replace(tmp_index, self.index_file)
+                tmp_entries = self.entries_file.with_suffix('.tmp')
+                with open(tmp_entries, 'w') as f:
+                    json.dump({
+                        'source_stamp': self._source_stamp(),
+                        'next_label': self.next_label,
+                        'entries': self.entries,
+                    }, f)
+                os.replace(tmp_entries, self.entries_file)
+                self.unsaved = 0
+            except Exception as e:
+                logger.error(f"Error saving response cache: {e}")
+
+    # ===========================
+    # Lookup and Store
+    # ===========================
+
+    @staticmethod
+    def fingerprint(doc_names: Iterable[str]) -> str:
+        """Order-independent fingerprint of a retrieved document set."""
+        return hashlib.sha1("\n".join(sorted(doc_names)).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def scope_for(user_id: str) -> str:
+        """Map a user to the cache scope configured in 'SCOPE'."""
+        return user_id if RESPONSE_CACHE_CONFIG['SCOPE'] == 'user' else 'global'
+
+    def lookup(self, query_embedding: np.ndarray, doc_names: List[str], user_id: str = "global") -> Optional[str]:
+        """
+        Return a cached response for a near-duplicate query with the same retrieved context.
+
+        :param query_embedding: A (1, dim) float32 query vector.
+        :param doc_names: Documents retrieved for the query.
+        :param user_id: The user asking.
+        :return: The cached response, or None on a miss.
+        """
+        scope = self.scope_for(user_id)
+        fingerprint = self.fingerprint(doc_names)
+        ttl = RESPONSE_CACHE_CONFIG['TTL']
+        with self.lock:
+            k = min(RESPONSE_CACHE_CONFIG['CANDIDATES'], self.scope_counts[scope])
+            if k > 0:
+                try:
+                    labels, distances = self.index.knn_query(
+                        query_embedding, k=k,
+                        filter=lambda label: self.entries.get(label, {}).get('scope') == scope
+                    )
+                except RuntimeError:
+                    labels, distances = np.empty((1, 0), dtype=np.uint64), np.empty((1, 0))
+                for label, distance in zip(labels[0], distances[0]):
+                    if 1.0 - distance < RESPONSE_CACHE_CONFIG['SIMILARITY_THRESHOLD']:
+                        break  # Results are sorted by distance, so the rest are further away
+                    entry = self.entries.get(int(label))
+                    if entry is None or entry['fingerprint'] != fingerprint:
+                        continue
+                    if ttl is not None and time.time() - entry['created'] > ttl:
+                        continue
+                    metrics.increment('cache_hits', cache='response')
+                    logger.info(f"Response cache hit for user {user_id} (similarity {1.0 - distance:.3f}).")
+                    return entry['response']
+        metrics.increment('cache_misses', cache='response')
+        return None
+
+    def store(self, query: str, query_embedding: np.ndarray, doc_names: List[str], response: str,
+              user_id: str = "global"):
+        """
+        Cache a response for later near-duplicate queries.
+
+        :param query: The original query text (kept for inspection).
+        :param query_embedding: A (1, dim) float32 query vector.
+        :param doc_names: Documents retrieved for the query.
+        :param response: The generated response.
+        :param user_id: The user who asked.
+        """
+        with self.lock:
+            if len(self.entries) >= RESPONSE_CACHE_CONFIG['MAX_ENTRIES']:
+                self._remove(next(iter(self.entries)))  # Dicts keep insertion order, so this is the oldest
+            label = self.next_label
+            self.next_label += 1
+            self.index.add_items(query_embedding, [label], replace_deleted=True)
+            self.entries[label] = {
+                'scope': self.scope_for(user_id),
+                'fingerprint': self.fingerprint(doc_names),
+                'docs': list(doc_names),
+                'query': query,
+                'response': response,
+                'created': time.time(),
+            }
+            self.scope_counts[self.entries[label]['scope']] += 1
+            self.unsaved += 1
+            metrics.set_gauge('response_cache_size', len(self.entries))
+            should_save = self.unsaved >= RESPONSE_CACHE_CONFIG['SAVE_EVERY']
+        if should_save:
+            self.save()
+
+    # ===========================
+    # Invalidation
+    # ===========================
+
+    def _remove(self, label: int):
+        """Drop one entry; the caller holds the lock."""
+        entry = self.entries.pop(label)
+        self.scope_counts[entry['scope']] -= 1
+        self.index.mark_deleted(label)
+
+    def invalidate_documents(self, doc_names: Optional[Iterable[str]]):
+        """
+        Drop cached responses built from changed documents.
+
+        :param doc_names: Changed document names, or None to clear the whole cache.
+        """
+        with self.lock:
+            if doc_names is None:
+                removed = len(self.entries)
+                self.index = self._new_index()
+                self.entries, self.scope_counts = {}, Counter()
+            else:
+                changed = set(doc_names)
+                stale = [label for label, entry in self.entries.items() if changed.intersection(entry['docs'])]
+                for label in stale:
+                    self._remove(label)
+                removed = len(stale)
+            metrics.set_gauge('response_cache_size', len(self.entries))
+        if removed:
+            logger.info(f"Invalidated {removed} cached responses after a document change.")
+            self.save()
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# This class avoids regenerating answers to questions that were already answered in other words.
+# To modify:
+# - Raise 'SIMILARITY_THRESHOLD' in RESPONSE_CACHE_CONFIG if distinct questions get the same answer;
+#   lower it to reuse answers more aggressively.
+# - Set 'SCOPE' to 'global' to share answers between users, or 'ENABLED' to False to turn it off.
+# - Delete the 'response_cache' directory under CACHE_DIR to clear the cache manually.
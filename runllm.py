@@ -3,7 +3,11 @@
 from database_manager import DatabaseManager
 from rag_optimizer import RAGOptimizer
 from tts import TTS
-from config import LOGGING_CONFIG
+from response_cache import SemanticResponseCache
+import threading
+from typing import Optional
+from config import LOGGING_CONFIG, RESPONSE_CACHE_CONFIG
+from metrics import metrics, timed
 import logging
 
 # ===========================
@@ -23,47 +27,73 @@ logger = logging.getLogger(__name__)
 # ===========================
 
 class TheraxusAI:
-    def __init__(self, user_id="default_user"):
+    def __init__(self, user_id="default_user", db_manager=None, rag=None, tts=None):
         """
         Initialize the Theraxus AI system for a specific user.
         
         :param user_id: A unique identifier for the user, used for handling user-specific sessions.
+        :param db_manager: Optional DatabaseManager; a default one is created if omitted.
+        :param rag: Optional RAGOptimizer; a default one sharing `db_manager` is created if omitted.
+        :param tts: Optional TTS engine; the pyttsx3 engine is created if omitted.
         """
         self.user_id = user_id  # Placeholder for user identification (multi-user support)
-        self.db_manager = DatabaseManager()
-        self.rag = RAGOptimizer()
-        self.tts = TTS()
+        self.db_manager = db_manager or DatabaseManager()
+        self.rag = rag or RAGOptimizer(db_manager=self.db_manager)
+        self.tts = tts or TTS(user_id=user_id)
+        self.response_cache = SemanticResponseCache(self.rag) if RESPONSE_CACHE_CONFIG['ENABLED'] else None
 
-    def generate_response(self, user_input: str) -> str:
+    @timed('generate_response')
+    def generate_response(self, user_input: str, cancel_event: Optional[threading.Event] = None) -> str:
         """
         Generate AI response based on user input.
         
         :param user_input: User's input message as a string.
+        :param cancel_event: Optional event; if set before the response is recorded, the turn
+                             is abandoned, nothing is added to the chat history and an empty
+                             string is returned.
         :return: Response generated by the AI as a string.
         """
-        try:
-            # Log the received user input
-            logger.info(f"Received input from user {self.user_id}: {user_input}")
-
-            # Add user input to chat history
-            self.db_manager.add_chat(user_id=self.user_id, role="user", content=user_input)
-
-            # Retrieve relevant documents for the user-specific context
-            relevant_docs = self.rag.search_documents(user_input, user_id=self.user_id)
-            context = " ".join(relevant_docs)
-
-            # Placeholder for AI response generation
-            # In a real scenario, integrate with a language model like LLama
-            response = f"Based on your input, here's a summary: {context[:100]}..."
-
-            # Add AI response to chat history
-            self.db_manager.add_chat(user_id=self.user_id, role="assistant", content=response)
-
-            logger.info(f"Generated response for user {self.user_id}: {response}")
-            return response
-        except Exception as e:
-            logger.error(f"Error generating response for user {self.user_id}: {e}")
-            return "I'm sorry, I encountered an error while processing your request."
+        with metrics.profile_turn(self.user_id):
+            try:
+                # Log the received user input
+                logger.info(f"Received input from user {self.user_id}: {user_input}")
+
+                # Retrieve relevant documents for the user-specific context
+                query_embedding = self.rag.embed_query(user_input)
+                relevant_docs = self.rag.search_by_embedding(query_embedding, user_id=self.user_id)
+                context = " ".join(relevant_docs)
+
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.info(f"Turn cancelled for user {self.user_id}")
+                    return ""
+
+                # Reuse the answer to a near-duplicate question over the same documents
+                response = None
+                if self.response_cache is not None:
+                    response = self.response_cache.lookup(query_embedding, relevant_docs, self.user_id)
+
+                if response is None:
+                    # Placeholder for AI response generation
+                    # In a real scenario, integrate with a language model like LLama
+                    response = f"Based on your input, here's a summary: {context[:100]}..."
+                    if self.response_cache is not None:
+                        self.response_cache.store(user_input, query_embedding, relevant_docs, response, self.user_id)
+
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.info(f"Turn cancelled for user {self.user_id}")
+                    return ""
+
+                # Record the exchange only once it is answered, so an abandoned turn leaves no trace
+                self.db_manager.add_chat(user_id=self.user_id, role="user", content=user_input)
+                self.db_manager.add_chat(user_id=self.user_id, role="assistant", content=response)
+
+                logger.info(f"Generated response for user {self.user_id}: {response}")
+                return response
+            except Exception as e:
+                logger.error(f"Error generating response for user {self.user_id}: {e}")
+                return "I'm sorry, I encountered an error while processing your request."
+            finally:
+                metrics.maybe_export()
 
 # ===========================
 # Main Function for Text-Based Chat
@@ -130,6 +160,7 @@ if __name__ == "__main__":
 
 # To modify:
 # - Integrate a real language model (e.g., LLama) in the generate_response method.
+# - Per-stage latencies are exported to logs/metrics.prom and logs/metrics.json (see METRICS_CONFIG).
 # - Enhance the response generation logic to utilize context from retrieved documents.
 # - Implement additional commands or functionalities as needed (e.g., 'save', 'load', 'docs').
 # - Further customize user identification and authentication if needed for advanced multi-user support.
@@ -0,0 +1,362 @@
+# sharded_retrieval.py
+
+import atexit
+import json
+import multiprocessing
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import hnswlib
+import numpy as np
+from label_filter import filtered_knn_query
+from metrics import metrics
+import logging
+
+# ===========================
+# Logger Setup
+# ===========================
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Shard Worker Process
+# ===========================
+
+def _shard_worker(shard_id: int, space: str, dim: int, conn):
+    """
+    Serve one shard's hnswlib index over a pipe until told to stop.
+
+    Each message is (command, args); each reply is ('ok', result) or ('error', message).
+    A rebuild runs on a background thread while the old index keeps answering queries;
+    it is swapped in once 'rebuild_status' finds it finished.
+    """
+    index: Optional[hnswlib.Index] = None
+    build_params = {'ef_construction': 200, 'M': 16}
+    ef = 10
+    rebuild: Optional[Dict] = None  # The rebuild in progress: thread, index, error, journal of adds
+
+    def new_index(max_elements: int) -> hnswlib.Index:
+        fresh = hnswlib.Index(space=space, dim=dim)
+        fresh.init_index(max_elements=max(1, max_elements), **build_params)
+        fresh.set_ef(ef)
+        return fresh
+
+    def add_to(target: hnswlib.Index, vectors, labels):
+        required = target.get_current_count() + len(labels)
+        if required > target.get_max_elements():
+            target.resize_index(max(required, target.get_max_elements() * 2))
+        target.add_items(vectors, labels)
+
+    def build(job: Dict, vectors, labels):
+        try:
+            job['index'] = new_index(max(len(labels) * 2, 1024))
+            if len(labels):
+                job['index'].add_items(vectors, labels)
+        except Exception as e:
+            job['error'] = f"{type(e).__name__}: {e}"
+
+    while True:
+        command, args = conn.recv()
+        try:
+            if command == 'stop':
+                conn.send(('ok', None))
+                break
+            elif command == 'init':
+                max_elements, build_params['ef_construction'], build_params['M'] = args
+                index = new_index(max_elements)
+                result = None
+            elif command == 'load':
+                index = hnswlib.Index(space=space, dim=dim)
+                index.load_index(args[0])
+                index.set_ef(ef)
+                result = index.get_current_count()
+            elif command == 'save':
+                index.save_index(args[0])
+                result = None
+            elif command == 'set_ef':
+                ef = args[0]
+                index.set_ef(ef)
+                result = None
+            elif command == 'resize':
+                if args[0] > index.get_max_elements():
+                    index.resize_index(args[0])
+                result = None
+            elif command == 'add':
+                vectors, labels = args
+                add_to(index, vectors, labels)
+                if rebuild is not None:
+                    rebuild['journal'].append((vectors, labels))  # Replayed onto the rebuilt index
+                result = index.get_current_count()
+            elif command == 'rebuild':
+                if rebuild is not None:
+                    raise ValueError("A rebuild is already in progress")
+                vectors, labels = args
+                rebuild = {'index': None, 'error': None, 'journal': []}
+                rebuild['thread'] = threading.Thread(target=build, args=(rebuild, vectors, labels), daemon=True)
+                rebuild['thread'].start()
+                result = None
+            elif command == 'rebuild_status':
+                # None while building; the new element count once the rebuilt index is in use
+                if rebuild is None:
+                    raise ValueError("No rebuild in progress")
+                if rebuild['thread'].is_alive():
+                    result = None
+                else:
+                    done, rebuild = rebuild, None
+                    if done['error'] is not None:
+                        raise RuntimeError(f"rebuild failed, keeping the old index: {done['error']}")
+                    for vectors, labels in done['journal']:
+                        add_to(done['index'], vectors, labels)
+                    done['index'].set_ef(ef)
+                    index = done['index']
+                    result = index.get_current_count()
+            elif command == 'search':
+                vectors, k, packed_mask, length = args
+                if packed_mask is None:
+                    result = index.knn_query(vectors, k=k)
+                else:
+                    mask = np.unpackbits(packed_mask, count=length).astype(bool)
+                    result = filtered_knn_query(index, vectors, k, mask)
+            elif command == 'stats':
+                result = (index.get_current_count(), index.get_max_elements())
+            else:
+                raise ValueError(f"Unknown shard command '{command}'")
+            conn.send(('ok', result))
+        except Exception as e:
+            conn.send(('error', f"shard {shard_id}: {type(e).__name__}: {e}"))
+
+# ===========================
+# ShardedIndex Class
+# ===========================
+
+class ShardedIndex:
+    def __init__(self, space: str, dim: int, num_shards: int, shard_dir: Path):
+        """
+        Vector index partitioned across worker processes, each owning one hnswlib shard.
+
+        Exposes the subset of hnswlib.Index used by RAGOptimizer, so it can replace the
+        in-process index. Labels are assigned to shard `label % num_shards`; queries are
+        sent to every shard and the per-shard top-k lists are merged by distance.
+
+        :param space: hnswlib distance space, e.g. 'cosine'.
+        :param dim: Vector dimension.
+        :param num_shards: Number of shard processes.
+        :param shard_dir: Directory holding one index file per shard.
+        """
+        self.space = space
+        self.dim = dim
+        self.num_shards = num_shards
+        self.shard_dir = Path(shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        self.counts = [0] * num_shards
+        self.locks = [threading.Lock() for _ in range(num_shards)]  # One per pipe, so shards are independent
+
+        context = multiprocessing.get_context()
+        self.connections, self.processes = [], []
+        for shard_id in range(num_shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_shard_worker, args=(shard_id, space, dim, child_conn),
+                                      name=f"theraxus-shard-{shard_id}", daemon=True)
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+        atexit.register(self.close)
+        logger.info(f"Started {num_shards} retrieval shard processes.")
+
+    # ===========================
+    # Shard Messaging
+    # ===========================
+
+    def _call(self, shard_ids: List[int], command: str, args_per_shard: List[Tuple]) -> List:
+        """
+        Send a command to several shards at once, then collect their replies in order.
+
+        :raises RuntimeError: If any shard reports an error or its process has exited.
+        """
+        locks = [self.locks[shard_id] for shard_id in sorted(set(shard_ids))]  # Fixed order avoids deadlock
+        for lock in locks:
+            lock.acquire()
+        try:
+            replies, sent = {}, []
+            for shard_id, args in zip(shard_ids, args_per_shard):
+                try:
+                    self.connections[shard_id].send((command, args))
+                    sent.append(shard_id)
+                except (BrokenPipeError, EOFError, OSError):
+                    replies[shard_id] = ('error', f"shard {shard_id}: process is not running")
+            # Every sent command is answered before returning, so no pipe is left holding a stale reply
+            for shard_id in sent:
+                try:
+                    replies[shard_id] = self.connections[shard_id].recv()
+                except (EOFError, OSError):
+                    replies[shard_id] = ('error', f"shard {shard_id}: process exited")
+        finally:
+            for lock in locks:
+                lock.release()
+        errors = [replies[shard_id][1] for shard_id in shard_ids if replies[shard_id][0] == 'error']
+        if errors:
+            logger.error(f"Retrieval shard '{command}' failed: {'; '.join(errors)}")
+            raise RuntimeError("; ".join(errors))
+        return [replies[shard_id][1] for shard_id in shard_ids]
+
+    def _broadcast(self, command: str, *args) -> List:
+        """Send the same command to every shard."""
+        return self._call(list(range(self.num_shards)), command, [args] * self.num_shards)
+
+    def shard_of(self, labels: np.ndarray) -> np.ndarray:
+        """Shard number owning each label."""
+        return np.asarray(labels, dtype=np.int64) % self.num_shards
+
+    def _shard_file(self, shard_id: int) -> str:
+        return str(self.shard_dir / f"shard_{shard_id}.bin")
+
+    # ===========================
+    # hnswlib-Compatible API
+    # ===========================
+
+    def init_index(self, max_elements: int, ef_construction: int = 200, M: int = 16):
+        """Create empty shards sharing `max_elements` between them."""
+        per_shard = -(-max_elements // self.num_shards)
+        self._broadcast('init', per_shard, ef_construction, M)
+        self.counts = [0] * self.num_shards
+
+    def load_index(self, path: str):
+        """
+        Load every shard listed in the manifest at `path`.
+
+        :raises ValueError: If the manifest was written for a different shard layout.
+        """
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+        if manifest['num_shards'] != self.num_shards or manifest['dim'] != self.dim or manifest['space'] != self.space:
+            raise ValueError(f"Shard manifest {path} does not match the configured layout "
+                             f"({self.num_shards} shards, dim {self.dim}, space '{self.space}')")
+        self.counts = self._call(list(range(self.num_shards)), 'load',
+                                 [(self._shard_file(shard_id),) for shard_id in range(self.num_shards)])
+
+    def save_index(self, path: str):
+        """Save every shard, then write the manifest at `path` describing them."""
+        self._call(list(range(self.num_shards)), 'save',
+                   [(self._shard_file(shard_id),) for shard_id in range(self.num_shards)])
+        with open(path, 'w') as f:
+            json.dump({'num_shards': self.num_shards, 'dim': self.dim, 'space': self.space,
+                       'counts': self.counts}, f, indent=4)
+
+    def set_ef(self, ef: int):
+        self._broadcast('set_ef', ef)
+
+    def get_current_count(self) -> int:
+        return sum(self.counts)
+
+    def get_max_elements(self) -> int:
+        return sum(max_elements for _, max_elements in self._broadcast('stats'))
+
+    def resize_index(self, new_size: int):
+        self._broadcast('resize', -(-new_size // self.num_shards))
+
+    def add_items(self, data, ids):
+        """Route each vector to the shard owning its label."""
+        data = np.asarray(data, dtype=np.float32)
+        ids = np.asarray(list(ids), dtype=np.int64)
+        owners = self.shard_of(ids)
+        shard_ids = [shard_id for shard_id in range(self.num_shards) if np.any(owners == shard_id)]
+        args = [(data[owners == shard_id], ids[owners == shard_id]) for shard_id in shard_ids]
+        for shard_id, count in zip(shard_ids, self._call(shard_ids, 'add', args)):
+            self.counts[shard_id] = count
+        for shard_id, count in enumerate(self.counts):
+            metrics.set_gauge('rag_shard_size', count, shard=str(shard_id))
+
+    def knn_query(self, data, k: int = 1, filter: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scatter the query vectors to every non-empty shard and merge their top-k.
+
+        :param filter: Optional boolean bitset indexed by label (see label_filter.py); each
+                       shard receives only its own part, packed to one bit per label.
+        :return: (labels, distances) arrays shaped (num_queries, k), nearest first.
+        """
+        data = np.asarray(data, dtype=np.float32).reshape(-1, self.dim)
+        if filter is None:
+            available = list(self.counts)
+            masks = [None] * self.num_shards
+        else:
+            masks = []
+            for shard_id in range(self.num_shards):
+                shard_mask = np.zeros(len(filter), dtype=bool)
+                shard_mask[shard_id::self.num_shards] = filter[shard_id::self.num_shards]
+                masks.append(shard_mask)
+            available = [min(int(mask.sum()), count) for mask, count in zip(masks, self.counts)]
+        if k > sum(available):
+            raise RuntimeError(f"k={k} exceeds the {sum(available)} searchable elements")
+
+        shard_ids = [shard_id for shard_id, count in enumerate(available) if count > 0]
+        args = [
+            (data, min(k, available[shard_id]),
+             None if masks[shard_id] is None else np.packbits(masks[shard_id]),
+             None if masks[shard_id] is None else len(masks[shard_id]))
+            for shard_id in shard_ids
+        ]
+        with metrics.span('rag.shard_scatter_gather'):
+            replies = self._call(shard_ids, 'search', args)
+
+        labels = np.concatenate([shard_labels for shard_labels, _ in replies], axis=1)
+        distances = np.concatenate([shard_distances for _, shard_distances in replies], axis=1)
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(labels, order, axis=1), np.take_along_axis(distances, order, axis=1)
+
+    # ===========================
+    # Independent Shard Rebuild
+    # ===========================
+
+    def rebuild_shard(self, shard_id: int, data, ids):
+        """
+        Replace one shard's contents while every shard, this one included, keeps serving queries.
+
+        :param shard_id: Shard to rebuild.
+        :param data: Vectors for every label the shard should hold.
+        :param ids: Labels, all of which must belong to `shard_id`.
+        """
+        data = np.asarray(data, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.asarray(list(ids), dtype=np.int64)
+        if np.any(self.shard_of(ids) != shard_id):
+            raise ValueError(f"Labels passed to rebuild_shard({shard_id}) belong to other shards")
+        # The shard builds in the background and keeps answering queries from its old index;
+        # the pipe is only held for each short status poll
+        self._call([shard_id], 'rebuild', [(data, ids)])
+        while True:
+            count = self._call([shard_id], 'rebuild_status', [()])[0]
+            if count is not None:
+                break
+            time.sleep(0.05)
+        self.counts[shard_id] = count
+        self._call([shard_id], 'save', [(self._shard_file(shard_id),)])
+        metrics.set_gauge('rag_shard_size', self.counts[shard_id], shard=str(shard_id))
+        logger.info(f"Rebuilt retrieval shard {shard_id} with {self.counts[shard_id]} elements.")
+
+    def close(self):
+        """Stop the shard processes."""
+        for conn, process in zip(self.connections, self.processes):
+            if process.is_alive():
+                try:
+                    conn.send(('stop', ()))
+                    conn.recv()
+                except (EOFError, OSError):
+                    pass
+                process.join(timeout=5)
+        self.processes = []
+        self.connections = []
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# This module spreads the vector index over several local processes so index size and query
+# throughput are not limited to one Python process.
+# To modify:
+# - Enable it with 'NUM_SHARDS' in RAG_CONFIG (0 keeps the single in-process index). Changing the
+#   shard count makes the existing shard files unusable, so the index is rebuilt on next start.
+# - Rebuild a single shard with RAGOptimizer.rebuild_shard(shard_id); queries keep being served, by the
+#   old copy of that shard, until the rebuilt one is swapped in.
+# - To place shards on other machines, replace the multiprocessing pipes with a network transport
+#   that carries the same (command, args) messages.
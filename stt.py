@@ -1,10 +1,14 @@
 # stt.py
 
-import whisper
 import numpy as np
 import sounddevice as sd
 import queue
-from config import STT_CONFIG
+import threading
+from collections import deque
+from typing import Callable, Iterator, Optional
+from config import STT_CONFIG, VOICE_CONFIG
+from stt_backends import Transcriber
+from metrics import timed
 import logging
 
 # ===========================
@@ -18,16 +22,23 @@ logger = logging.getLogger(__name__)
 # ===========================
 
 class WhisperSTT:
-    def __init__(self):
-        """Initialize the Whisper STT model."""
+    def __init__(self, user_id="global"):
+        """
+        Initialize the Whisper STT model.
+
+        :param user_id: The user whose speech is transcribed; tags this engine's metrics spans.
+        """
         try:
-            self.model = whisper.load_model(STT_CONFIG['MODEL_NAME'])  # e.g., 'base'
+            self.user_id = user_id
+            self.transcriber = Transcriber()
+            if not STT_CONFIG['AUTO_MODEL_SIZE']:
+                self.transcriber.get_backend(STT_CONFIG['MODEL_NAME'])  # Load eagerly so the first turn is not slowed
             self.sample_rate = STT_CONFIG['SAMPLE_RATE']
             self.channels = STT_CONFIG['CHANNELS']
             self.chunk_size = STT_CONFIG['CHUNK_SIZE']
             self.audio_queue = queue.Queue()
             self.recording = False
-            logger.info(f"Whisper STT model '{STT_CONFIG['MODEL_NAME']}' loaded successfully.")
+            logger.info(f"Whisper STT ready with backend '{STT_CONFIG['BACKEND']}' and model '{STT_CONFIG['MODEL_NAME']}'.")
         except Exception as e:
             logger.error(f"Whisper STT initialization error: {e}")
             raise
@@ -38,6 +49,7 @@ class WhisperSTT:
             logger.warning(f"Audio status: {status}")
         self.audio_queue.put(indata.copy())
 
+    @timed('stt.record_audio')
     def record_audio(self, duration: int = 5) -> np.ndarray:
         """Record audio from the microphone."""
         try:
@@ -53,6 +65,62 @@ class WhisperSTT:
             logger.error(f"Audio recording error: {e}")
             return np.array([])
 
+    def listen(self, stop_event: threading.Event, is_playing: Callable[[], bool] = lambda: False,
+               on_speech_start: Optional[Callable[[], None]] = None) -> Iterator[np.ndarray]:
+        """
+        Capture the microphone continuously and yield one clip per spoken utterance.
+
+        An utterance starts once the RMS level stays above 'SPEECH_THRESHOLD' for
+        'MIN_SPEECH_SECONDS' and ends after 'SILENCE_SECONDS' below it (see VOICE_CONFIG).
+        While `is_playing()` is true the stricter 'BARGE_IN_THRESHOLD' and
+        'BARGE_IN_SECONDS' apply, so the assistant's own voice picked up by the microphone
+        is not taken for the user's.
+
+        :param stop_event: Capture ends when this is set.
+        :param is_playing: Reports whether the assistant is currently speaking.
+        :param on_speech_start: Called on the capture thread as soon as an utterance starts,
+                                e.g. to interrupt playback.
+        :return: Generator of audio clips shaped (frames, channels).
+        """
+        frame_seconds = self.chunk_size / self.sample_rate
+        onset_seconds = max(VOICE_CONFIG['MIN_SPEECH_SECONDS'], VOICE_CONFIG['BARGE_IN_SECONDS'])
+        pre_roll = deque(maxlen=int(np.ceil((VOICE_CONFIG['PRE_ROLL_SECONDS'] + onset_seconds) / frame_seconds)))
+        frames, voiced_seconds, silent_seconds = None, 0.0, 0.0
+
+        with self.audio_queue.mutex:
+            self.audio_queue.queue.clear()  # Drop audio left over from an earlier recording
+        with sd.InputStream(samplerate=self.sample_rate, channels=self.channels,
+                            blocksize=self.chunk_size, callback=self._audio_callback):
+            logger.info("Listening continuously for speech...")
+            while not stop_event.is_set():
+                try:
+                    frame = self.audio_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                level = float(np.sqrt(np.mean(np.square(frame))))
+
+                if frames is None:
+                    # Waiting for speech: keep a short history so the onset is not clipped
+                    pre_roll.append(frame)
+                    playing = is_playing()
+                    threshold = VOICE_CONFIG['BARGE_IN_THRESHOLD'] if playing else VOICE_CONFIG['SPEECH_THRESHOLD']
+                    required = VOICE_CONFIG['BARGE_IN_SECONDS'] if playing else VOICE_CONFIG['MIN_SPEECH_SECONDS']
+                    voiced_seconds = voiced_seconds + frame_seconds if level >= threshold else 0.0
+                    if voiced_seconds >= required:
+                        frames, silent_seconds = list(pre_roll), 0.0
+                        pre_roll.clear()
+                        if on_speech_start is not None:
+                            on_speech_start()
+                    continue
+
+                frames.append(frame)
+                silent_seconds = silent_seconds + frame_seconds if level < VOICE_CONFIG['SPEECH_THRESHOLD'] else 0.0
+                if (silent_seconds >= VOICE_CONFIG['SILENCE_SECONDS']
+                        or len(frames) * frame_seconds >= VOICE_CONFIG['MAX_UTTERANCE_SECONDS']):
+                    yield np.concatenate(frames, axis=0)
+                    frames, voiced_seconds = None, 0.0
+
+    @timed('stt.process_audio')
     def process_audio(self) -> (str, bool):
         """Process the recorded audio and transcribe it."""
         try:
@@ -60,14 +128,23 @@ class WhisperSTT:
             if audio.size == 0:
                 return "", False
             logger.info("Transcribing audio...")
-            result = self.model.transcribe(audio)
-            transcription = result["text"].strip()
+            transcription = self.transcribe(audio)
             logger.debug(f"Transcription: {transcription}")
             return transcription, True
         except Exception as e:
             logger.error(f"Audio processing error: {e}")
             return "", False
 
+    @timed('stt.transcribe')
+    def transcribe(self, audio: np.ndarray) -> str:
+        """
+        Transcribe recorded audio with the configured STT backend.
+        
+        :param audio: Samples shaped (frames,) or (frames, channels) at the configured sample rate.
+        :return: The transcription text.
+        """
+        return self.transcriber.transcribe(audio)
+
     def cleanup(self):
         """Cleanup resources if any."""
         try:
@@ -82,5 +159,7 @@ class WhisperSTT:
 # This class manages the Speech-to-Text (STT) functionality using OpenAI's Whisper model.
 # To modify:
 # - Change the Whisper model by updating 'MODEL_NAME' in STT_CONFIG within config.py.
+# - Switch the inference engine (e.g. int8 faster-whisper on CPU) with 'BACKEND' in STT_CONFIG; see stt_backends.py.
 # - Adjust the recording duration by modifying the 'duration' parameter in the record_audio method.
+# - Tune how `listen` splits continuous microphone audio into utterances with VOICE_CONFIG.
 # - Implement additional audio preprocessing steps if needed before transcription.
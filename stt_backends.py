@@ -0,0 +1,285 @@
+# stt_backends.py
+
+import os
+import threading
+import wave
+from abc import ABC, abstractmethod
+from typing import Dict
+import numpy as np
+from config import STT_CONFIG
+import logging
+
+# ===========================
+# Logger Setup
+# ===========================
+
+logger = logging.getLogger(__name__)
+
+class QuantizationError(RuntimeError):
+    """Raised when a model could not be quantized to int8."""
+
+# ===========================
+# STTBackend Interface
+# ===========================
+
+class STTBackend(ABC):
+    """Base class for speech-to-text engines that transcribe 16 kHz mono float32 audio."""
+
+    name = "base"
+
+    def __init__(self, model_size: str):
+        """
+        Load the model for the given Whisper size.
+
+        :param model_size: Whisper model size, e.g. 'tiny', 'base', 'small'.
+        """
+        self.model_size = model_size
+
+    @abstractmethod
+    def transcribe(self, audio: np.ndarray) -> str:
+        """
+        Transcribe a clip of audio.
+
+        :param audio: 1-D float32 samples in [-1, 1] at STT_CONFIG['SAMPLE_RATE'].
+        :return: The transcription text.
+        """
+
+def _cpu_threads() -> int:
+    """Resolve the configured thread count, where 0 means every core."""
+    return STT_CONFIG['CPU_THREADS'] or os.cpu_count() or 1
+
+# ===========================
+# openai-whisper Backends
+# ===========================
+
+class WhisperBackend(STTBackend):
+    """Full-precision PyTorch inference through openai-whisper."""
+
+    name = "whisper"
+
+    def __init__(self, model_size: str):
+        super().__init__(model_size)
+        import torch
+        import whisper
+        torch.set_num_threads(_cpu_threads())
+        self.model = self._prepare(whisper.load_model(model_size, device=self._device()))
+        self.fp16 = self.model.device.type == "cuda"  # fp16 is not supported on CPU
+
+    def _device(self):
+        """The device to load the model on; None lets openai-whisper pick CUDA when available."""
+        device = STT_CONFIG['DEVICE']
+        return None if device == 'auto' else device
+
+    def _prepare(self, model):
+        """Hook for subclasses to transform the loaded model."""
+        return model
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        beam_size = STT_CONFIG['BEAM_SIZE']
+        result = self.model.transcribe(
+            audio,
+            fp16=self.fp16,
+            language=STT_CONFIG['LANGUAGE'],
+            beam_size=beam_size if beam_size > 1 else None,
+        )
+        return result["text"].strip()
+
+class QuantizedWhisperBackend(WhisperBackend):
+    """openai-whisper with its Linear layers dynamically quantized to int8."""
+
+    name = "whisper-int8"
+
+    def _device(self):
+        return "cpu"  # PyTorch's dynamic quantization only runs on CPU
+
+    def _prepare(self, model):
+        import torch
+        import whisper.model
+        # openai-whisper builds its layers from its own nn.Linear subclass (which only adds a dtype
+        # cast), but quantize_dynamic swaps exact nn.Linear types only, so retype them first
+        for module in model.modules():
+            if type(module) is whisper.model.Linear:
+                module.__class__ = torch.nn.Linear
+        quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        swapped = sum(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in quantized.modules())
+        if swapped == 0:
+            raise QuantizationError(f"Dynamic quantization left every Linear layer of Whisper "
+                                    f"'{self.model_size}' in fp32")
+        logger.info(f"Quantized {swapped} Linear layers of Whisper '{self.model_size}' to int8.")
+        return quantized
+
+# ===========================
+# CTranslate2 Backend
+# ===========================
+
+class FasterWhisperBackend(STTBackend):
+    """Int8 inference through faster-whisper (CTranslate2), on CPU or CUDA."""
+
+    name = "faster-whisper"
+
+    def __init__(self, model_size: str):
+        super().__init__(model_size)
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(
+            model_size,
+            device=STT_CONFIG['DEVICE'],
+            compute_type=STT_CONFIG['COMPUTE_TYPE'],
+            cpu_threads=_cpu_threads(),
+        )
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        segments, _ = self.model.transcribe(
+            audio,
+            beam_size=STT_CONFIG['BEAM_SIZE'],
+            language=STT_CONFIG['LANGUAGE'],
+        )
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    QuantizedWhisperBackend.name: QuantizedWhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+def create_backend(name: str, model_size: str) -> STTBackend:
+    """
+    Instantiate an STT backend by name, falling back to openai-whisper if its package is
+    missing or its model could not be quantized.
+
+    :param name: One of the keys of BACKENDS.
+    :param model_size: Whisper model size.
+    :return: A loaded STTBackend.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STT backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    try:
+        return BACKENDS[name](model_size)
+    except (ImportError, QuantizationError) as e:
+        if name == WhisperBackend.name:
+            raise
+        logger.warning(f"STT backend '{name}' unavailable ({e}); falling back to '{WhisperBackend.name}'.")
+        return WhisperBackend(model_size)
+
+# ===========================
+# Audio File Loading
+# ===========================
+
+def load_audio(path, sample_rate: int = None) -> np.ndarray:
+    """
+    Read an audio file as 1-D float32 mono at `sample_rate`.
+
+    PCM WAV is read with the standard library; other formats (mp3, flac, m4a, ...) are
+    decoded through faster-whisper or openai-whisper, whichever is installed.
+
+    :param path: Audio file path.
+    :param sample_rate: Target rate in Hz; defaults to STT_CONFIG['SAMPLE_RATE'].
+    :return: Samples in [-1, 1].
+    """
+    sample_rate = sample_rate or STT_CONFIG['SAMPLE_RATE']
+    path = str(path)
+    if not path.lower().endswith('.wav'):
+        try:
+            from faster_whisper.audio import decode_audio
+            return decode_audio(path, sampling_rate=sample_rate)
+        except ImportError:
+            import whisper
+            if sample_rate != whisper.audio.SAMPLE_RATE:
+                raise ValueError(f"openai-whisper only decodes at {whisper.audio.SAMPLE_RATE} Hz")
+            return whisper.load_audio(path)
+
+    with wave.open(path, 'rb') as f:
+        width, channels, rate = f.getsampwidth(), f.getnchannels(), f.getframerate()
+        raw = f.readframes(f.getnframes())
+    if width == 1:
+        audio = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        audio = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768
+    elif width == 4:
+        audio = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"{path}: unsupported WAV sample width {width}")
+    audio = audio.reshape(-1, channels).mean(axis=1)
+    if rate != sample_rate:
+        target = np.arange(0, len(audio), rate / sample_rate)
+        audio = np.interp(target, np.arange(len(audio)), audio).astype(np.float32)
+    return audio
+
+def probe_duration(path) -> float:
+    """
+    Return an audio file's length in seconds without decoding it.
+
+    Exact for WAV; other formats are estimated from file size (assuming ~128 kbit/s),
+    which is good enough for ordering work by length.
+    """
+    path = str(path)
+    if path.lower().endswith('.wav'):
+        with wave.open(path, 'rb') as f:
+            return f.getnframes() / f.getframerate()
+    return os.path.getsize(path) / 16000
+
+# ===========================
+# Transcriber Class
+# ===========================
+
+class Transcriber:
+    def __init__(self, backend: str = None, model_size: str = None):
+        """
+        Transcribe audio with the configured backend, optionally choosing the model size per clip.
+
+        Models are loaded lazily and cached per size, so only the sizes actually used are loaded.
+
+        :param backend: Backend name; defaults to STT_CONFIG['BACKEND'].
+        :param model_size: Fixed model size; defaults to STT_CONFIG['MODEL_NAME'].
+        """
+        self.backend_name = backend or STT_CONFIG['BACKEND']
+        self.model_size = model_size or STT_CONFIG['MODEL_NAME']
+        self.sample_rate = STT_CONFIG['SAMPLE_RATE']
+        self.backends: Dict[str, STTBackend] = {}
+        self.lock = threading.Lock()
+
+    def size_for(self, duration: float) -> str:
+        """
+        Pick a model size for a clip of the given length.
+
+        :param duration: Clip length in seconds.
+        :return: The Whisper model size to use.
+        """
+        if not STT_CONFIG['AUTO_MODEL_SIZE']:
+            return self.model_size
+        for max_seconds, size in STT_CONFIG['MODEL_SIZE_BY_DURATION']:
+            if max_seconds is None or duration <= max_seconds:
+                return size
+        return self.model_size
+
+    def get_backend(self, model_size: str) -> STTBackend:
+        """Return the cached backend for a model size, loading it on first use."""
+        with self.lock:
+            if model_size not in self.backends:
+                self.backends[model_size] = create_backend(self.backend_name, model_size)
+                logger.info(f"Loaded STT backend '{self.backends[model_size].name}' with model '{model_size}'.")
+            return self.backends[model_size]
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        """
+        Transcribe a clip, converting it to 1-D float32 mono first.
+
+        :param audio: Samples shaped (frames,) or (frames, channels).
+        :return: The transcription text.
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        if audio.ndim == 2:
+            audio = audio.mean(axis=1)
+        duration = audio.shape[0] / self.sample_rate
+        return self.get_backend(self.size_for(duration)).transcribe(audio)
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# This module provides interchangeable Speech-to-Text engines behind the STTBackend interface.
+# To modify:
+# - Select the engine with 'BACKEND' in STT_CONFIG; 'faster-whisper' with 'COMPUTE_TYPE': 'int8' is the
+#   fastest option on CPU-only machines. Set 'DEVICE' to pin inference to 'cpu' or 'cuda'.
+# - Add an engine by subclassing STTBackend, implementing `transcribe`, and registering it in BACKENDS.
+# - Enable 'AUTO_MODEL_SIZE' and edit 'MODEL_SIZE_BY_DURATION' to pick the model per utterance length.
+# - Compare engines on your own recordings with `python -m benchmarks.stt_compare <wav_dir>`.
@@ -2,7 +2,9 @@
 
 import pyttsx3
 import threading
+from typing import Callable, Optional
 from config import TTS_CONFIG
+from metrics import timed
 import logging
 
 # ===========================
@@ -16,28 +18,54 @@ logger = logging.getLogger(__name__)
 # ===========================
 
 class TTS:
-    def __init__(self):
-        """Initialize the pyttsx3 TTS engine."""
+    def __init__(self, user_id="global"):
+        """
+        Initialize the pyttsx3 TTS engine.
+
+        :param user_id: The user being spoken to; tags this engine's metrics spans.
+        """
         try:
+            self.user_id = user_id
             self.engine = pyttsx3.init()
             self.engine.setProperty('rate', TTS_CONFIG['RATE'])
             self.engine.setProperty('volume', TTS_CONFIG['VOLUME'])
             # Optionally, set voice (male/female) here
             # voices = self.engine.getProperty('voices')
             # self.engine.setProperty('voice', voices[0].id)  # Change index for different voices
+            self._interrupted: Optional[Callable[[], bool]] = None
+            self.engine.connect('started-word', self._on_started_word)
             logger.info("pyttsx3 TTS engine initialized successfully.")
         except Exception as e:
             logger.error(f"TTS initialization error: {e}")
             raise
 
-    def speak(self, text: str):
-        """Convert text to speech."""
+    @timed('tts.speak')
+    def speak(self, text: str, interrupted: Optional[Callable[[], bool]] = None):
+        """
+        Convert text to speech.
+
+        :param text: Text to speak.
+        :param interrupted: Optional check, safe to call from the speaking thread, polled
+                            before speaking and at every word; once it returns True the
+                            utterance stops, e.g. when the user talks over it.
+        """
         try:
+            if interrupted is not None and interrupted():
+                return
+            self._interrupted = interrupted
             self.engine.say(text)
             self.engine.runAndWait()
             logger.debug(f"TTS speaking: {text[:50]}...")
         except Exception as e:
             logger.error(f"TTS speaking error: {e}")
+        finally:
+            self._interrupted = None
+
+    def _on_started_word(self, name, location, length):
+        # Runs inside runAndWait on the speaking thread, the only thread pyttsx3 lets call stop()
+        if self._interrupted is not None and self._interrupted():
+            self.engine.stop()
+            logger.debug("TTS playback interrupted.")
 
     def speak_async(self, text: str):
         """Speak text asynchronously to avoid blocking."""
@@ -0,0 +1,287 @@
+# vector_store.py
+
+import argparse
+import ast
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple
+import numpy as np
+from config import VECTOR_DB_CONFIG
+import logging
+
+# ===========================
+# Logger Setup
+# ===========================
+
+logger = logging.getLogger(__name__)
+
+# Fixed .npy header size, so the row count can be rewritten in place when rows are appended
+HEADER_SIZE = 128
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+# ===========================
+# VectorStore Class
+# ===========================
+
+class VectorStore:
+    def __init__(self, directory: Path, dtype: Optional[str] = None):
+        """
+        Binary vector store: one contiguous matrix in a .npy file plus a parallel id list.
+
+        vectors.npy is a standard NumPy file (readable with np.load) whose header is padded
+        to HEADER_SIZE bytes, so new rows are appended to the end of the file and only the
+        shape in the header is rewritten. ids.txt holds one JSON-encoded id per line, in
+        row order. Reads map the matrix with np.memmap instead of parsing it.
+
+        :param directory: Directory holding vectors.npy and ids.txt.
+        :param dtype: 'float32' or 'float16' used when the store is (re)written; defaults to
+                      VECTOR_DB_CONFIG['DTYPE']. Appends keep the dtype already on disk.
+        """
+        self.directory = Path(directory)
+        self.vectors_path = self.directory / 'vectors.npy'
+        self.ids_path = self.directory / 'ids.txt'
+        self.dtype = np.dtype(dtype or VECTOR_DB_CONFIG['DTYPE'])
+        self.lock = threading.Lock()
+        self._ids: Optional[List[str]] = None
+        self._ids_end = 0  # Byte offset in ids.txt just past the last committed id
+        self._rows: Dict[str, int] = {}
+
+    # ===========================
+    # File Format
+    # ===========================
+
+    @staticmethod
+    def _header(rows: int, dim: int, dtype: np.dtype) -> bytes:
+        """Build a version 1.0 .npy header for a C-ordered (rows, dim) matrix, padded to HEADER_SIZE."""
+        header = repr({'descr': dtype.str, 'fortran_order': False, 'shape': (rows, dim)}).encode('latin1')
+        length = HEADER_SIZE - len(NPY_MAGIC) - 2
+        return NPY_MAGIC + length.to_bytes(2, 'little') + header.ljust(length - 1) + b'\n'
+
+    def _read_header(self) -> Tuple[int, int, np.dtype]:
+        """Return (rows, dim, dtype) from the .npy header."""
+        with open(self.vectors_path, 'rb') as f:
+            prefix = f.read(HEADER_SIZE)
+        if not prefix.startswith(NPY_MAGIC):
+            raise ValueError(f"{self.vectors_path} is not a vector store file")
+        header = ast.literal_eval(prefix[len(NPY_MAGIC) + 2:].decode('latin1').strip())
+        rows, dim = header['shape']
+        return rows, dim, np.dtype(header['descr'])
+
+    def exists(self) -> bool:
+        """Whether the store has been written."""
+        return self.vectors_path.exists()
+
+    def _recover(self):
+        """
+        Finish or undo a rewrite interrupted by a crash; the caller holds the lock.
+
+        write_matrix replaces vectors.npy first and ids.txt last. An ids.txt.tmp without a
+        vectors.tmp means the new vectors are already in place, so the new ids are moved in
+        too; if both temporary files remain, the old pair is still intact and they are dropped.
+        """
+        tmp_vectors = self.vectors_path.with_suffix('.tmp')
+        tmp_ids = self.ids_path.with_suffix('.tmp')
+        if tmp_ids.exists():
+            if tmp_vectors.exists():
+                tmp_vectors.unlink()
+                tmp_ids.unlink()
+            else:
+                os.replace(tmp_ids, self.ids_path)
+            self._ids = None
+
+    # ===========================
+    # Reading
+    # ===========================
+
+    def ids(self) -> List[str]:
+        """Ids in row order."""
+        with self.lock:
+            return list(self._load_ids())
+
+    def _load_ids(self) -> List[str]:
+        """Read ids.txt once, ignoring ids past the committed row count; the caller holds the lock."""
+        self._recover()
+        if self._ids is None:
+            self._ids, self._ids_end = [], 0
+            if self.exists():
+                rows, _, _ = self._read_header()
+                with open(self.ids_path, 'rb') as f:
+                    for _ in range(rows):
+                        self._ids.append(json.loads(f.readline()))
+                    self._ids_end = f.tell()
+            self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        return self._ids
+
+    def load(self) -> Tuple[List[str], np.ndarray]:
+        """
+        Map the stored vectors without copying them into memory.
+
+        :return: (ids, matrix) where matrix is a read-only (len(ids), dim) np.memmap.
+        """
+        with self.lock:
+            ids = list(self._load_ids())
+            if not ids:
+                return [], np.empty((0, 0), dtype=self.dtype)
+            return ids, np.load(self.vectors_path, mmap_mode='r')
+
+    def matrix(self) -> np.ndarray:
+        """Map the stored vectors like `load`, without copying the id list (e.g. to see appended rows)."""
+        with self.lock:
+            if not self._load_ids():
+                return np.empty((0, 0), dtype=self.dtype)
+            return np.load(self.vectors_path, mmap_mode='r')
+
+    def get(self, vector_id: str) -> Optional[np.ndarray]:
+        """Return one vector as a float32 copy, or None if the id is unknown."""
+        with self.lock:
+            self._load_ids()
+            row = self._rows.get(vector_id)
+            if row is None:
+                return None
+            return np.array(np.load(self.vectors_path, mmap_mode='r')[row], dtype=np.float32)
+
+    # ===========================
+    # Writing
+    # ===========================
+
+    def write(self, vectors: Mapping[str, np.ndarray]):
+        """
+        Replace the whole store atomically.
+
+        :param vectors: Mapping of id to 1-D vector.
+        """
+        ids = list(vectors)
+        matrix = np.asarray([vectors[vector_id] for vector_id in ids], dtype=self.dtype)
+        self.write_matrix(ids, matrix)
+
+    def write_matrix(self, ids: List[str], matrix: np.ndarray):
+        """
+        Replace the whole store atomically from an id list and a (len(ids), dim) matrix.
+
+        :param ids: Ids in row order; must be unique.
+        :param matrix: Vectors, one row per id.
+        """
+        if len(set(ids)) != len(ids):
+            raise ValueError("Vector ids must be unique")
+        matrix = np.ascontiguousarray(matrix, dtype=self.dtype)
+        matrix = matrix.reshape(len(ids), matrix.shape[-1] if ids else 0)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            tmp_vectors = self.vectors_path.with_suffix('.tmp')
+            with open(tmp_vectors, 'wb') as f:
+                f.write(self._header(len(ids), matrix.shape[1], self.dtype))
+                f.write(matrix.tobytes())
+            tmp_ids = self.ids_path.with_suffix('.tmp')
+            with open(tmp_ids, 'wb') as f:
+                f.writelines(self._encode_id(vector_id) for vector_id in ids)
+            # Vectors first, ids last; if a crash falls in between, _recover completes the swap
+            os.replace(tmp_vectors, self.vectors_path)
+            os.replace(tmp_ids, self.ids_path)
+            self._ids = None
+
+    def append(self, vectors: Mapping[str, np.ndarray]):
+        """
+        Add vectors in place. Ids already stored have their row overwritten; new ids are
+        appended to the end of the file, and the header's row count is updated last.
+
+        :param vectors: Mapping of id to 1-D vector.
+        """
+        if not vectors:
+            return
+        with self.lock:
+            self._recover()
+            rows, dim, dtype = self._read_header() if self.exists() else (0, 0, self.dtype)
+        if rows == 0:
+            self.write(vectors)
+            return
+
+        with self.lock:
+            known = self._load_ids()
+            updates = {vector_id: vector for vector_id, vector in vectors.items() if vector_id in self._rows}
+            new_ids = [vector_id for vector_id in vectors if vector_id not in self._rows]
+            new_rows = np.asarray([vectors[vector_id] for vector_id in new_ids], dtype=dtype).reshape(len(new_ids), -1 if new_ids else dim)
+            if new_ids and new_rows.shape[1] != dim:
+                raise ValueError(f"Vector dimension {new_rows.shape[1]} does not match the store's {dim}")
+
+            if updates:
+                matrix = np.load(self.vectors_path, mmap_mode='r+')
+                for vector_id, vector in updates.items():
+                    matrix[self._rows[vector_id]] = np.asarray(vector, dtype=dtype)
+                matrix.flush()
+                del matrix
+
+            if new_ids:
+                with open(self.vectors_path, 'r+b') as f:
+                    # Drop anything an interrupted append left past the committed rows
+                    f.truncate(HEADER_SIZE + rows * dim * dtype.itemsize)
+                    f.seek(0, os.SEEK_END)
+                    f.write(new_rows.tobytes())
+                    with open(self.ids_path, 'r+b') as ids_file:
+                        ids_file.truncate(self._ids_end)
+                        ids_file.seek(self._ids_end)
+                        ids_file.writelines(self._encode_id(vector_id) for vector_id in new_ids)
+                        self._ids_end = ids_file.tell()
+                    f.flush()
+                    # The new rows become visible only once the header carries the new count
+                    f.seek(0)
+                    f.write(self._header(rows + len(new_ids), dim, dtype))
+                for vector_id in new_ids:
+                    self._rows[vector_id] = len(known)
+                    known.append(vector_id)
+
+    @staticmethod
+    def _encode_id(vector_id: str) -> bytes:
+        """One ids.txt line; JSON escaping keeps ids containing newlines on a single line."""
+        return (json.dumps(vector_id) + "\n").encode('utf-8')
+
+# ===========================
+# JSON Conversion
+# ===========================
+
+def convert_json(json_path: Path, directory: Path, dtype: Optional[str] = None) -> int:
+    """
+    Convert a vector_db.json of {id: [floats]} into a binary store.
+
+    :param json_path: The JSON vector database.
+    :param directory: Destination store directory.
+    :param dtype: Stored precision; defaults to VECTOR_DB_CONFIG['DTYPE'].
+    :return: Number of vectors converted.
+    """
+    with open(json_path, 'r') as f:
+        vectors = json.load(f)
+    if vectors:
+        VectorStore(directory, dtype).write(vectors)
+    logger.info(f"Converted {len(vectors)} vectors from {json_path} to {directory}")
+    return len(vectors)
+
+# ===========================
+# Main Function for Conversion
+# ===========================
+
+def main():
+    """Command-line entry point converting a JSON vector database to the binary format."""
+    parser = argparse.ArgumentParser(description="Convert a JSON vector database to the binary vector store.")
+    parser.add_argument('json_path', type=Path, help="vector_db.json to convert")
+    parser.add_argument('directory', type=Path, help="Destination directory for vectors.npy and ids.txt")
+    parser.add_argument('--dtype', choices=['float32', 'float16'], help="Stored precision (default: VECTOR_DB_CONFIG['DTYPE'])")
+    args = parser.parse_args()
+    print(f"Converted {convert_json(args.json_path, args.directory, args.dtype)} vectors.")
+
+# ===========================
+# Entry Point
+# ===========================
+
+if __name__ == "__main__":
+    main()
+
+# ===========================
+# Instructions for Modifications
+# ===========================
+
+# This module stores embedding vectors in a compact binary form that is mapped, not parsed, on load.
+# To modify:
+# - Set 'DTYPE' in VECTOR_DB_CONFIG to 'float16' to halve disk and page-cache use at a small cost
+#   in precision; existing stores keep their dtype until rewritten.
+# - The files are plain NumPy: np.load('vectors.npy', mmap_mode='r') reads them from any tool.
@@ -1,12 +1,17 @@
 # voice_runllm.py
 
+import queue
+import re
 import signal
 import sys
+import threading
 import time
+from typing import Callable, List, Optional, Tuple
 from stt import WhisperSTT
 from tts import TTS
 from runllm import TheraxusAI
-from config import LOGGING_CONFIG
+from config import LOGGING_CONFIG, VOICE_CONFIG
+from metrics import metrics
 import logging
 
 # ===========================
@@ -21,19 +26,71 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Queues of the stages fed by the capture thread, in pipeline order
+PIPELINE_STAGES = ('stt', 'response', 'tts')
+
+# ===========================
+# PipelineRun Class
+# ===========================
+
+class PipelineRun:
+    def __init__(self):
+        """
+        Queues, stop signal and playback flag of one voice pipeline run.
+
+        Each run_pipeline call gets its own, so a worker still busy in a long transcription
+        or response after its run ended can never take work from (or hand work to) a later run.
+        """
+        self.stop_event = threading.Event()
+        self.speaking = threading.Event()  # Set while a response is being played
+        self.queues = {stage: queue.Queue(maxsize=VOICE_CONFIG['QUEUE_SIZE']) for stage in PIPELINE_STAGES}
+
+    def put(self, stage: str, item: Tuple) -> bool:
+        """Hand an item to a stage, waiting while its queue is full; False once the run stops."""
+        stage_queue = self.queues[stage]
+        while not self.stop_event.is_set():
+            try:
+                stage_queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            metrics.set_gauge('voice_queue_depth', stage_queue.qsize(), stage=stage)
+            return True
+        return False
+
+    def get(self, stage: str) -> Optional[Tuple]:
+        """Take a stage's next item, or None once the run stops."""
+        stage_queue = self.queues[stage]
+        while not self.stop_event.is_set():
+            try:
+                item = stage_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            metrics.set_gauge('voice_queue_depth', stage_queue.qsize(), stage=stage)
+            return item
+        return None
+
 # ===========================
 # VoiceInterface Class
 # ===========================
 
 class VoiceInterface:
-    def __init__(self, user_id="default_user"):
-        """Initialize voice interface with STT, TTS, and AI components."""
+    def __init__(self, user_id="default_user", ai=None):
+        """
+        Initialize voice interface with STT, TTS, and AI components.
+        
+        :param user_id: A unique identifier for the user.
+        :param ai: Optional TheraxusAI instance to share (e.g. with the GUI's text mode).
+        """
         try:
             self.user_id = user_id  # Placeholder for multi-user support
-            self.stt = WhisperSTT()
-            self.tts = TTS()
-            self.ai = TheraxusAI()
+            self.stt = WhisperSTT(user_id=user_id)
+            self.tts = TTS(user_id=user_id)
+            self.ai = ai or TheraxusAI(user_id=user_id)
             self.running = True
+            self.stop_event = threading.Event()  # Set to end a voice chat session started from another thread
+            self.turn_lock = threading.Lock()
+            self.epoch = 0  # Bumped whenever the user starts speaking; older turns are then stale
+            self.cancel_event = None  # Cancels the response being generated
             logger.info(f"Voice Interface initialized successfully for user: {user_id}")
         except Exception as e:
             logger.error(f"Voice Interface initialization error for user {user_id}: {e}")
@@ -43,6 +100,7 @@ class VoiceInterface:
         """Handle graceful exit on Ctrl+C."""
         print("\nExiting voice interface...")
         logger.info("Voice Interface terminated by user.")
+        self.stop_event.set()
         self.cleanup()
         sys.exit(0)
     
@@ -50,28 +108,174 @@ class VoiceInterface:
         """Start the voice chat loop."""
         signal.signal(signal.SIGINT, self.exit_gracefully)
         print("Voice Interface Ready! Speak into your microphone.")
-        self.tts.speak("Hello! I'm ready to assist you.")
-        
-        while self.running:
+        self.run_pipeline(
+            on_transcript=lambda text: print(f"You: {text}"),
+            on_response=lambda text: print(f"AI: {text}"),
+            greeting="Hello! I'm ready to assist you.",
+        )
+
+    # ===========================
+    # Voice Pipeline
+    # ===========================
+
+    def run_pipeline(self, on_transcript: Optional[Callable[[str], None]] = None,
+                     on_response: Optional[Callable[[str], None]] = None,
+                     generate: Optional[Callable[[str, threading.Event], str]] = None,
+                     greeting: Optional[str] = None):
+        """
+        Run capture, transcription, response generation and speech as concurrent stages.
+
+        Each stage has its own thread and takes work from a bounded queue (see
+        'QUEUE_SIZE' in VOICE_CONFIG), so the microphone keeps listening while earlier
+        turns are transcribed, answered and spoken, and a slow stage holds back the one
+        feeding it instead of letting work pile up. When the user starts speaking, the
+        answer being generated is cancelled and playback stops (barge-in); transcripts
+        not yet answered are joined with what the user says next. Blocks until
+        `stop_event` is set; workers still busy then finish in the background without
+        affecting later runs.
+
+        :param on_transcript: Called with each user input as it is passed to the AI.
+        :param on_response: Called with each response before it is spoken.
+        :param generate: Produces a response from (user_input, cancel_event); defaults to
+                         the AI's generate_response.
+        :param greeting: Optional text spoken when the pipeline starts.
+        """
+        run = PipelineRun()
+        self.cancel_event = None
+        workers = [
+            threading.Thread(target=self._capture_stage, name="voice-capture", daemon=True, args=(run,)),
+            threading.Thread(target=self._stt_stage, name="voice-stt", daemon=True, args=(run,)),
+            threading.Thread(target=self._response_stage, name="voice-response", daemon=True,
+                             args=(run, on_transcript or (lambda text: None), on_response or (lambda text: None),
+                                   generate or self.ai.generate_response)),
+            threading.Thread(target=self._tts_stage, name="voice-tts", daemon=True, args=(run,)),
+        ]
+        if greeting:
+            run.put('tts', (self.epoch, greeting, None))
+        for worker in workers:
+            worker.start()
+        logger.info(f"Voice pipeline started for user {self.user_id}")
+        try:
+            while self.running and not self.stop_event.is_set() and not run.stop_event.is_set():
+                self.stop_event.wait(0.5)
+        finally:
+            run.stop_event.set()
+            with self.turn_lock:
+                if self.cancel_event is not None:
+                    self.cancel_event.set()
+            for worker in workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    logger.warning(f"Voice pipeline worker {worker.name} is still busy; it will exit when done.")
+            logger.info(f"Voice pipeline stopped for user {self.user_id}")
+
+    def _on_speech_start(self, run: PipelineRun):
+        """Barge-in: new speech makes the pending answer and the one being spoken stale."""
+        if not VOICE_CONFIG['BARGE_IN']:
+            return
+        with self.turn_lock:
+            self.epoch += 1
+            if self.cancel_event is not None:
+                self.cancel_event.set()
+        if run.speaking.is_set():
+            # Playback notices the new epoch at its next word (see _tts_stage)
+            logger.info(f"User {self.user_id} interrupted playback.")
+            metrics.increment('voice_barge_ins')
+
+    def _capture_stage(self, run: PipelineRun):
+        """Split microphone audio into utterances, including while a response is playing."""
+        try:
+            for audio in self.stt.listen(run.stop_event, is_playing=run.speaking.is_set,
+                                         on_speech_start=lambda: self._on_speech_start(run)):
+                # Utterances are tagged with the epoch their onset started, to detect later speech
+                if not run.put('stt', (self.epoch, audio, time.monotonic())):
+                    break
+        except Exception as e:
+            logger.error(f"Voice capture error for user {self.user_id}: {e}")
+            print("AI: I can't access the microphone.")
+            run.stop_event.set()
+
+    def _stt_stage(self, run: PipelineRun):
+        """Transcribe utterances. Empty transcripts are passed on too, as they release held ones."""
+        while True:
+            item = run.get('stt')
+            if item is None:
+                break
+            epoch, audio, ended_at = item
             try:
-                print("\nListening...")
-                user_input, success = self.stt.process_audio()
-                
-                if success and user_input:
-                    print(f"You: {user_input}")
-                    response = self.ai.generate_response(user_input, user_id=self.user_id)
-                    print(f"AI: {response}")
-                    self.tts.speak(response)
-                else:
-                    print("AI: I didn't catch that. Please try again.")
-                    self.tts.speak("I didn't catch that. Please try again.")
-                
-                time.sleep(1)  # Short pause before next listening
-                
+                text = self.stt.transcribe(audio).strip()
+            except Exception as e:
+                logger.error(f"Transcription error for user {self.user_id}: {e}")
+                text = ""
+            if not run.put('response', (epoch, text, ended_at)):
+                break
+
+    def _response_stage(self, run: PipelineRun, on_transcript: Callable[[str], None], on_response: Callable[[str], None],
+                        generate: Callable[[str, threading.Event], str]):
+        """Generate a response per user input, merging transcripts the user kept talking after."""
+        held: List[str] = []
+        while True:
+            item = run.get('response')
+            if item is None:
+                break
+            epoch, text, ended_at = item
+            if text:
+                held.append(text)
+            with self.turn_lock:
+                if epoch != self.epoch:
+                    continue  # More speech follows; answer it together with this
+                cancel_event = self.cancel_event = threading.Event()
+            if not held:
+                continue
+            user_input, held = " ".join(held), []
+            on_transcript(user_input)
+            try:
+                response = generate(user_input, cancel_event)
             except Exception as e:
                 logger.error(f"Voice chat error for user {self.user_id}: {e}")
-                print("AI: I encountered an error. Please try again.")
-                self.tts.speak("I encountered an error. Please try again.")
+                response = "I encountered an error. Please try again."
+            with self.turn_lock:
+                if self.cancel_event is cancel_event:
+                    self.cancel_event = None
+                superseded = cancel_event.is_set() and epoch != self.epoch
+            if superseded:
+                # The user kept talking: answer this input together with what follows
+                logger.info(f"Voice turn for user {self.user_id} superseded by new speech.")
+                held = [user_input] + held
+                continue
+            if not response or cancel_event.is_set():
+                continue
+            on_response(response)
+            if not run.put('tts', (epoch, response, ended_at)):
+                break
+
+    def _tts_stage(self, run: PipelineRun):
+        """
+        Speak responses sentence by sentence.
+
+        The TTS engine checks whether the response went stale (new speech or stop) before
+        speaking and at every word, on its own thread, so a barge-in cuts playback at the
+        next word and no sentence starts after it.
+        """
+        while True:
+            item = run.get('tts')
+            if item is None:
+                break
+            epoch, text, ended_at = item
+
+            def interrupted() -> bool:
+                with self.turn_lock:
+                    return epoch != self.epoch or run.stop_event.is_set()
+
+            run.speaking.set()
+            for sentence in re.split(r'(?<=[.!?])\s+', text.strip()):
+                if interrupted():
+                    break
+                if ended_at is not None:
+                    metrics.observe('voice.turn_around', time.monotonic() - ended_at, self.user_id)
+                    ended_at = None
+                self.tts.speak(sentence, interrupted=interrupted)
+            run.speaking.clear()
     
     def cleanup(self):
         """Cleanup resources."""
@@ -111,4 +315,6 @@ if __name__ == "__main__":
 # - Enhance the voice command recognition to handle specific commands like 'load', 'docs', etc.
 # - Integrate multi-user support by handling user IDs based on voice input or separate sessions.
 # - Improve error handling and feedback mechanisms for better user experience.
+# - Tune the pipeline's queue sizes, speech detection and barge-in behaviour with VOICE_CONFIG in config.py;
+#   the 'voice_queue_depth' gauge shows which stage is holding the others back.
 # - Implement voice prompts or confirmations as needed.